@@ -0,0 +1,287 @@
+import asyncio
+import functools
+import io
+import logging
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+import server
+from change_feed import CLOSED, SUBSCRIBER_QUEUE_SIZE, format_sse
+from server import event_name, reset_frame, replay_events, SSE_KEEPALIVE_SECONDS
+
+# Run with any ASGI server, e.g. `uvicorn asgi_app:app` from backend/cores.
+# Every route is the Flask app from server.py, called WSGI-style on a thread
+# pool; only /api/events is served natively so an open stream costs a queue
+# rather than a thread.
+
+logger = logging.getLogger("todolist.asgi")
+
+flask_app = server.get_app()
+storage = server.storage
+# A request holds at most one pooled connection at a time (streamed lists
+# read on a connection of their own), so with as many workers as connections
+# no worker waits on the pool. A slow upload to /api/import keeps its worker and its
+# connection for as long as the body takes to arrive.
+executor = ThreadPoolExecutor(max_workers=storage.pool.size, thread_name_prefix="asgi-worker")
+OVERFLOW = {"op": "overflow"}
+
+
+async def run_blocking(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+
+class ReceiveStream(io.RawIOBase):
+    # wsgi.input backed by ASGI receive(): the body is read as the app asks
+    # for it, so a large import never sits in memory whole.
+    def __init__(self, receive, loop):
+        self._receive = receive
+        self._loop = loop
+        self._buffer = b""
+        self._done = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, target):
+        while not self._buffer and not self._done:
+            message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+            if message["type"] == "http.disconnect":
+                self._done = True
+                break
+            self._buffer = message.get("body", b"")
+            self._done = not message.get("more_body", False)
+        size = min(len(target), len(self._buffer))
+        target[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+def build_environ(scope, body):
+    server_name, server_port = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        # No Content-Length (chunked uploads) still means "read to the end".
+        "wsgi.input_terminated": True,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False
+    }
+    for key, value in scope.get("headers", []):
+        name = key.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = f"HTTP_{name}"
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+
+def start_wsgi(environ):
+    # Runs on the executor: calls the app and pulls the first chunk, so the
+    # status is known even when the body is a generator.
+    response = {}
+    written = []
+
+    def start_response(status, headers, exc_info=None):
+        if exc_info and response:
+            raise exc_info[1].with_traceback(exc_info[2])
+        response["status"] = int(status.split(" ", 1)[0])
+        response["headers"] = [
+            (key.lower().encode("latin-1"), value.encode("latin-1")) for key, value in headers
+        ]
+        return written.append
+
+    body = flask_app(environ, start_response)
+    chunks = iter(body)
+    first = next(chunks, b"")
+    return response, b"".join(written) + first, chunks, body
+
+
+async def wsgi(scope, receive, send):
+    loop = asyncio.get_running_loop()
+    environ = build_environ(scope, io.BufferedReader(ReceiveStream(receive, loop)))
+    response, first, chunks, body = await run_blocking(start_wsgi, environ)
+    try:
+        await send({"type": "http.response.start", "status": response["status"], "headers": response["headers"]})
+        if first:
+            await send({"type": "http.response.body", "body": first, "more_body": True})
+        sentinel = object()
+        while True:
+            chunk = await run_blocking(next, chunks, sentinel)
+            if chunk is sentinel:
+                break
+            if chunk:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+    finally:
+        close = getattr(body, "close", None)
+        if close is not None:
+            await run_blocking(close)
+    await send({"type": "http.response.body", "body": b""})
+
+
+class AsyncChangeFeed:
+    # One thread reads the ChangeHub and fans events out to asyncio queues.
+    # It subscribes as soon as the feed exists, so nothing published between
+    # a client reading hub.seq and its first event can slip past.
+    def __init__(self, hub):
+        self.hub = hub
+        self._lock = threading.Lock()
+        self._listeners = set()
+        self._stop = threading.Event()
+        self._subscription = hub.subscribe()
+        self._thread = threading.Thread(target=self._pump, name="asgi-change-feed", daemon=True)
+        self._thread.start()
+
+    def subscribe(self):
+        listener = (asyncio.get_running_loop(), asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE))
+        with self._lock:
+            self._listeners.add(listener)
+        return listener
+
+    def unsubscribe(self, listener):
+        with self._lock:
+            self._listeners.discard(listener)
+
+    def _pump(self):
+        subscription = self._subscription
+        try:
+            while not self._stop.is_set():
+                event = subscription.get(timeout=1)
+                if subscription.overflowed:
+                    subscription.overflowed = False
+                    event = OVERFLOW
+                if event is None:
+                    continue
+                with self._lock:
+                    listeners = list(self._listeners)
+                for listener in listeners:
+                    loop, events = listener
+                    try:
+                        loop.call_soon_threadsafe(self._deliver, events, event)
+                    except RuntimeError:
+                        # The listener's loop is gone; nobody will read it.
+                        self.unsubscribe(listener)
+                if event is CLOSED:
+                    break
+        finally:
+            subscription.close()
+
+    @staticmethod
+    def _deliver(events, event):
+        try:
+            events.put_nowait(event)
+        except asyncio.QueueFull:
+            # Same policy as the WSGI stream: a slow reader gets a reset.
+            while not events.empty():
+                events.get_nowait()
+            events.put_nowait(OVERFLOW)
+
+    def close(self):
+        self._stop.set()
+
+
+change_feed = AsyncChangeFeed(storage.changes)
+
+
+def header(scope, name):
+    for key, value in scope.get("headers", []):
+        if key.decode("latin-1").lower() == name:
+            return value.decode("latin-1")
+    return None
+
+
+async def events(scope, receive, send):
+    hub = change_feed.hub
+    query = dict(parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+    last_seq = server.parse_last_event_id(header(scope, "last-event-id") or query.get("last_event_id"))
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache"), (b"x-accel-buffering", b"no")]
+    })
+
+    async def emit(text):
+        await send({"type": "http.response.body", "body": text.encode("utf-8"), "more_body": True})
+
+    listener = change_feed.subscribe()
+    events_queue = listener[1]
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        await emit("retry: 3000\n\n")
+        sent, frames = replay_events(hub, last_seq)
+        for frame in frames:
+            await emit(frame)
+        while not disconnected.done() and not hub.closed:
+            getter = asyncio.ensure_future(events_queue.get())
+            done, _ = await asyncio.wait(
+                {getter, disconnected}, timeout=SSE_KEEPALIVE_SECONDS, return_when=asyncio.FIRST_COMPLETED
+            )
+            if getter not in done:
+                getter.cancel()
+                if not disconnected.done():
+                    await emit(": keepalive\n\n")
+                continue
+            event = getter.result()
+            if event is CLOSED:
+                break
+            if event is OVERFLOW:
+                sent, frame = reset_frame(hub)
+                await emit(frame)
+                continue
+            if event["seq"] <= sent:
+                continue
+            sent = event["seq"]
+            await emit(format_sse(event, name=event_name(event)))
+    finally:
+        change_feed.unsubscribe(listener)
+        disconnected.cancel()
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            change_feed.close()
+            change_feed.hub.close()
+            executor.shutdown(wait=True)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+    if scope["method"] == "GET" and scope["path"] == "/api/events":
+        # Not timed: a stream lasts as long as the client stays, which would
+        # swamp the request latency histogram. todolist_sse_subscribers
+        # counts open streams instead.
+        await events(scope, receive, send)
+        return
+    # Flask records request_seconds for everything else.
+    await wsgi(scope, receive, send)
@@ -0,0 +1,139 @@
+from itertools import groupby
+
+MAX_BATCH_SIZE = 5000
+ID_CHUNK_SIZE = 500
+
+INSERT_SQL = """
+    INSERT INTO tasks (description, details, completed, due_date, category, priority, color)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Bulk imports assign ids and versions themselves so the per-row triggers
+# can be switched off for the duration.
+IMPORT_SQL = """
+    INSERT INTO tasks (id, version, description, details, completed, due_date, category, priority, color)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+ID_STATEMENTS = {
+    "done": "UPDATE tasks SET completed = 1 WHERE id = ?",
+    "reopen": "UPDATE tasks SET completed = 0 WHERE id = ?",
+    "remove": "DELETE FROM tasks WHERE id = ?",
+    "update": """
+        UPDATE tasks
+        SET description = ?, details = ?, due_date = ?, category = ?, priority = ?, color = ?
+        WHERE id = ?
+    """
+}
+
+BATCH_OPS = ("add",) + tuple(ID_STATEMENTS)
+TEXT_FIELDS = ("details", "category", "priority", "color")
+# Batches take due_date as given, so it only has to be a string.
+BATCH_TEXT_FIELDS = TEXT_FIELDS + ("due_date",)
+
+
+class BatchItem:
+    __slots__ = ("index", "op", "task_id", "params")
+
+    def __init__(self, index, op, task_id, params):
+        self.index = index
+        self.op = op
+        self.task_id = task_id
+        self.params = params
+
+
+def task_insert_params(task):
+    return (
+        task["description"],
+        task.get("details", ""),
+        task.get("completed", False),
+        task.get("due_date"),
+        task.get("category", "personal"),
+        task.get("priority", "medium"),
+        task.get("color")
+    )
+
+
+def check_text_fields(raw, fields=TEXT_FIELDS):
+    for field in fields:
+        value = raw.get(field)
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f"{field} must be a string")
+
+
+def parse_operation(index, raw):
+    if not isinstance(raw, dict):
+        raise ValueError("Operation must be an object")
+    op = raw.get("op")
+    if op not in BATCH_OPS:
+        raise ValueError(f"Unknown op: {op}")
+    if op == "add":
+        description = raw.get("description")
+        if not isinstance(description, str) or not description.strip():
+            raise ValueError("Description is required")
+        check_text_fields(raw, BATCH_TEXT_FIELDS)
+        return BatchItem(index, op, None, task_insert_params({**raw, "completed": bool(raw.get("completed", False))}))
+
+    try:
+        task_id = int(raw.get("id"))
+    except (TypeError, ValueError):
+        raise ValueError("Task ID is required")
+    if op == "update":
+        # Same defaults as the /api/update route, but a value that is there
+        # has to be a string.
+        if not isinstance(raw.get("description", ""), str):
+            raise ValueError("description must be a string")
+        check_text_fields(raw, BATCH_TEXT_FIELDS)
+        params = (
+            raw.get("description", ""),
+            raw.get("details", ""),
+            raw.get("due_date"),
+            raw.get("category", "personal"),
+            raw.get("priority", "medium"),
+            raw.get("color"),
+            task_id
+        )
+    else:
+        params = (task_id,)
+    return BatchItem(index, op, task_id, params)
+
+
+def parse_operations(operations):
+    if not isinstance(operations, list):
+        raise ValueError("operations must be a list")
+    if len(operations) > MAX_BATCH_SIZE:
+        raise ValueError(f"Batch is limited to {MAX_BATCH_SIZE} operations")
+    items = []
+    errors = []
+    for index, raw in enumerate(operations):
+        try:
+            items.append(parse_operation(index, raw))
+        except ValueError as exc:
+            op = raw.get("op") if isinstance(raw, dict) else None
+            errors.append({"index": index, "op": op, "ok": False, "error": str(exc)})
+    return items, errors
+
+
+def rolled_back(operations, results):
+    # An atomic batch that failed reports every operation: its own error, or
+    # that it was not kept.
+    report = []
+    for index, raw in enumerate(operations):
+        result = results.get(index)
+        if result is None or result["ok"]:
+            op = raw.get("op") if isinstance(raw, dict) else None
+            result = {"index": index, "op": op, "ok": False, "error": "Rolled back"}
+        report.append(result)
+    return report
+
+
+def consecutive_runs(items):
+    # Runs of the same op keep the caller's ordering while letting each run
+    # go through a single executemany.
+    for op, run in groupby(items, key=lambda item: item.op):
+        yield op, list(run)
+
+
+def chunked(values, size=ID_CHUNK_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
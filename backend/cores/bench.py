@@ -0,0 +1,401 @@
+"""
+Benchmarks for SQLStorage and the HTTP API.
+
+  python bench.py storage --sizes 1000,100000,1000000 --out storage.json
+  python bench.py http --concurrency 1,4,16 --out http.json
+  python bench.py asgi --concurrency 1,16,64 --out asgi.json
+  python bench.py startup --targets server,server:create_app,tray_app --out startup.json
+  python bench.py compare baseline.json current.json --threshold 0.15
+
+Every run works in a throwaway data directory and writes JSON that
+`compare` can diff against an earlier run.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_SIZES = (1000, 100000)
+DEFAULT_CONCURRENCY = (1, 4, 16)
+DEFAULT_ASGI_CONCURRENCY = (1, 16, 64)
+DEFAULT_OPS = 500
+DEFAULT_REQUESTS = 400
+DEFAULT_THRESHOLD = 0.15
+DEFAULT_STARTUP_TARGETS = ("server", "server:create_app", "tray_app")
+DEFAULT_STARTUP_RUNS = 5
+
+
+def isolate_data_dir():
+    # Must run before storage or server are imported: they resolve APPDATA
+    # when the database is first opened.
+    os.environ["APPDATA"] = tempfile.mkdtemp(prefix="todolist-bench-")
+
+
+def summarize(name, timings, **params):
+    timings = sorted(timings)
+    total = sum(timings)
+    quantiles = statistics.quantiles(timings, n=100) if len(timings) > 1 else timings * 99
+    return {
+        "name": name,
+        **params,
+        "ops": len(timings),
+        "seconds": round(total, 6),
+        "ops_per_sec": round(len(timings) / total, 1) if total else None,
+        "p50_ms": round(quantiles[49] * 1000, 3),
+        "p95_ms": round(quantiles[94] * 1000, 3),
+        "p99_ms": round(quantiles[98] * 1000, 3)
+    }
+
+
+def timed(fn, count):
+    timings = []
+    for index in range(count):
+        started = time.perf_counter()
+        fn(index)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def populate(storage, size):
+    records = (
+        (index + 1, {
+            "description": f"benchmark task {index}",
+            "details": "generated by bench.py",
+            "due_date": f"2025-{index % 12 + 1:02d}-{index % 28 + 1:02d}",
+            "category": ("work", "personal", "study")[index % 3],
+            "priority": ("low", "medium", "high")[index % 3],
+            "completed": index % 4 == 0
+        })
+        for index in range(size)
+    )
+    return storage.import_tasks(records)
+
+
+def bench_storage(sizes, ops=DEFAULT_OPS):
+    from dbinit import SQLinit
+    from storage import SQLStorage
+
+    results = []
+    for size in sizes:
+        name = f"bench_{size}"
+        db_path = SQLinit(name)
+        storage = SQLStorage(name)
+        try:
+            report = populate(storage, size)
+            results.append({
+                "name": "storage.populate", "size": size, "ops": report.imported,
+                "seconds": round(report.seconds, 6), "ops_per_sec": round(report.rate, 1)
+            })
+            ids = []
+            results.append(summarize("storage.add", timed(
+                lambda i: ids.append(storage.add_task({"description": f"added {i}", "category": "work"})), ops
+            ), size=size))
+            results.append(summarize("storage.list_page", timed(
+                lambda i: storage.query_task_rows(limit=50, status="open", category="work"), ops
+            ), size=size))
+            results.append(summarize("storage.search", timed(
+                lambda i: storage.search_tasks(f"task {i}", limit=20), min(ops, 100)
+            ), size=size))
+            results.append(summarize("storage.update", timed(
+                lambda i: storage.update_task(ids[i], f"updated {i}", "", None, "work", "high", None), ops
+            ), size=size))
+            results.append(summarize("storage.done", timed(lambda i: storage.done_task(ids[i]), ops), size=size))
+            results.append(summarize("storage.remove", timed(lambda i: storage.remove_task(ids[i]), ops), size=size))
+        finally:
+            storage.close()
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
+    return results
+
+
+def run_concurrent(call, requests, concurrency):
+    timings = []
+    lock = threading.Lock()
+
+    def worker(index):
+        started = time.perf_counter()
+        call(index)
+        elapsed = time.perf_counter() - started
+        with lock:
+            timings.append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(requests)))
+    return timings, time.perf_counter() - started
+
+
+async def run_asgi_concurrent(app, path, requests, concurrency):
+    timings = []
+    slots = asyncio.Semaphore(concurrency)
+    scope = {"type": "http", "method": "GET", "path": path, "query_string": b"", "headers": []}
+    if "?" in path:
+        scope["path"], query = path.split("?", 1)
+        scope["query_string"] = query.encode("latin-1")
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    async def one():
+        async with slots:
+            started = time.perf_counter()
+            await app(scope, receive, send)
+            timings.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return timings, time.perf_counter() - started
+
+
+def concurrent_result(name, timings, wall, **params):
+    result = summarize(name, timings, **params)
+    # Under concurrency throughput is requests over wall time.
+    result["ops_per_sec"] = round(len(timings) / wall, 1)
+    return result
+
+
+def bench_http(concurrency_levels, requests=DEFAULT_REQUESTS, size=1000):
+    from werkzeug.serving import make_server
+    import server
+
+    populate(server.storage, size)
+    client = server.app.test_client()
+    results = []
+    for name, call in (
+        ("http.client.list_page", lambda i: client.get("/api/list?limit=50")),
+        ("http.client.add", lambda i: client.post("/api/add", json={"description": f"client {i}"})),
+        ("http.client.health", lambda i: client.get("/api/health"))
+    ):
+        results.append(summarize(name, timed(call, requests), size=size, concurrency=1))
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    http_server = make_server("127.0.0.1", 0, server.app, threaded=True)
+    thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{http_server.server_port}"
+
+    def get(path):
+        with urllib.request.urlopen(base + path) as response:
+            response.read()
+
+    def post(path, payload):
+        request = urllib.request.Request(
+            base + path, data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"}, method="POST"
+        )
+        with urllib.request.urlopen(request) as response:
+            response.read()
+
+    try:
+        for concurrency in concurrency_levels:
+            for name, call in (
+                ("http.server.list_page", lambda i: get("/api/list?limit=50")),
+                ("http.server.add", lambda i: post("/api/add", {"description": f"server {i}"})),
+                ("http.server.health", lambda i: get("/api/health"))
+            ):
+                timings, wall = run_concurrent(call, requests, concurrency)
+                results.append(concurrent_result(name, timings, wall, size=size, concurrency=concurrency))
+    finally:
+        http_server.shutdown()
+        thread.join()
+    return results
+
+
+def bench_asgi(concurrency_levels, requests=DEFAULT_REQUESTS, size=1000):
+    # Both apps are driven in-process so the numbers compare the frameworks
+    # and the storage offloading, not an HTTP server.
+    import asgi_app
+    import server
+
+    populate(server.storage, size)
+    results = []
+    for concurrency in concurrency_levels:
+        for name, path in (("list_page", "/api/list?limit=50"), ("health", "/api/health")):
+            timings, wall = run_concurrent(lambda i: server.app.test_client().get(path), requests, concurrency)
+            results.append(concurrent_result(f"wsgi.{name}", timings, wall, size=size, concurrency=concurrency))
+            timings, wall = asyncio.run(run_asgi_concurrent(asgi_app.app, path, requests, concurrency))
+            results.append(concurrent_result(f"asgi.{name}", timings, wall, size=size, concurrency=concurrency))
+    return results
+
+
+def parse_importtime(text):
+    # "import time: self [us] | cumulative | imported package" lines from -X importtime.
+    imports = []
+    for line in text.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        imports.append((int(fields[0]), int(fields[1]), fields[2].strip()))
+    return imports
+
+
+def startup_code(target):
+    module, _, call = target.partition(":")
+    return f"import {module}" + (f"; {module}.{call}()" if call else "")
+
+
+def bench_startup(targets, runs=DEFAULT_STARTUP_RUNS):
+    # Fresh interpreters, so every run pays the full import cost.
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    for target in targets:
+        module = target.partition(":")[0]
+        timings, import_ms, slowest = [], [], []
+        for _ in range(runs):
+            env = {**os.environ, "APPDATA": tempfile.mkdtemp(prefix="todolist-bench-")}
+            started = time.perf_counter()
+            proc = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", startup_code(target)],
+                cwd=cwd, env=env, capture_output=True, text=True
+            )
+            elapsed = time.perf_counter() - started
+            if proc.returncode != 0:
+                print(f"{target}: failed ({proc.stderr.strip().splitlines()[-1]})", file=sys.stderr)
+                break
+            imports = parse_importtime(proc.stderr)
+            timings.append(elapsed)
+            import_ms.append(next((cumulative for _, cumulative, name in imports if name == module), 0) / 1000)
+            slowest = sorted(imports, reverse=True)[:10]
+        if not timings:
+            continue
+        result = summarize(f"startup.{target}", timings)
+        result["import_ms"] = round(statistics.median(import_ms), 3)
+        result["slowest_imports"] = [{"module": name, "self_ms": self_us / 1000} for self_us, _, name in slowest]
+        results.append(result)
+    return results
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z")
+    }
+
+
+def result_key(result):
+    return result["name"], result.get("size"), result.get("concurrency")
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    previous = {result_key(result): result for result in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        before = previous.get(result_key(result))
+        if before is None or not before.get("ops_per_sec") or not result.get("ops_per_sec"):
+            continue
+        change = result["ops_per_sec"] / before["ops_per_sec"] - 1
+        rows.append({
+            "key": result_key(result),
+            "before": before["ops_per_sec"],
+            "after": result["ops_per_sec"],
+            "change": change,
+            "regressed": change < -threshold
+        })
+    return rows
+
+
+def write_results(kind, results, path):
+    data = {"kind": kind, "environment": environment(), "results": results}
+    text = json.dumps(data, indent=2)
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return data
+
+
+def print_table(results):
+    for result in results:
+        label = " ".join(str(part) for part in result_key(result) if part is not None)
+        line = f"{label:<40} {result.get('ops_per_sec') or 0:>12.1f} ops/s"
+        if "p95_ms" in result:
+            line += f"  p50 {result['p50_ms']:.3f}ms  p95 {result['p95_ms']:.3f}ms"
+        print(line, file=sys.stderr)
+
+
+def parse_numbers(text):
+    return [int(part) for part in text.split(",") if part.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark SQLStorage and the HTTP API.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    storage_cmd = commands.add_parser("storage")
+    storage_cmd.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)))
+    storage_cmd.add_argument("--ops", type=int, default=DEFAULT_OPS)
+    storage_cmd.add_argument("--out")
+
+    http_cmd = commands.add_parser("http")
+    http_cmd.add_argument("--concurrency", default=",".join(map(str, DEFAULT_CONCURRENCY)))
+    http_cmd.add_argument("--requests", type=int, default=DEFAULT_REQUESTS)
+    http_cmd.add_argument("--size", type=int, default=1000)
+    http_cmd.add_argument("--out")
+
+    asgi_cmd = commands.add_parser("asgi")
+    asgi_cmd.add_argument("--concurrency", default=",".join(map(str, DEFAULT_ASGI_CONCURRENCY)))
+    asgi_cmd.add_argument("--requests", type=int, default=DEFAULT_REQUESTS)
+    asgi_cmd.add_argument("--size", type=int, default=1000)
+    asgi_cmd.add_argument("--out")
+
+    startup_cmd = commands.add_parser("startup")
+    startup_cmd.add_argument("--targets", default=",".join(DEFAULT_STARTUP_TARGETS))
+    startup_cmd.add_argument("--runs", type=int, default=DEFAULT_STARTUP_RUNS)
+    startup_cmd.add_argument("--out")
+
+    compare_cmd = commands.add_parser("compare")
+    compare_cmd.add_argument("baseline")
+    compare_cmd.add_argument("current")
+    compare_cmd.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+
+    args = parser.parse_args(argv)
+    if args.command == "compare":
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.current, encoding="utf-8") as f:
+            current = json.load(f)
+        rows = compare(baseline, current, args.threshold)
+        for row in rows:
+            label = " ".join(str(part) for part in row["key"] if part is not None)
+            flag = "  REGRESSION" if row["regressed"] else ""
+            print(f"{label:<40} {row['before']:>12.1f} -> {row['after']:>12.1f} ({row['change']:+.1%}){flag}")
+        return 1 if any(row["regressed"] for row in rows) else 0
+
+    isolate_data_dir()
+    if args.command == "startup":
+        results = bench_startup([target for target in args.targets.split(",") if target], runs=args.runs)
+    elif args.command == "storage":
+        results = bench_storage(parse_numbers(args.sizes), ops=args.ops)
+    elif args.command == "asgi":
+        results = bench_asgi(parse_numbers(args.concurrency), requests=args.requests, size=args.size)
+    else:
+        results = bench_http(parse_numbers(args.concurrency), requests=args.requests, size=args.size)
+    print_table(results)
+    write_results(args.command, results, args.out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
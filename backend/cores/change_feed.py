@@ -0,0 +1,142 @@
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKLOG = 1000
+SUBSCRIBER_QUEUE_SIZE = 1000
+RELAY_INTERVAL = 1.0
+RELAY_LIMIT = 500
+# Handed to subscribers when the hub shuts down so open streams can end.
+CLOSED = {"op": "closed"}
+
+
+class Subscription:
+    def __init__(self, hub):
+        self.hub = hub
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def get(self, timeout=None):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class ChangeHub:
+    def __init__(self, backlog=DEFAULT_BACKLOG, replay=True):
+        self._lock = threading.Lock()
+        self._events = deque(maxlen=backlog)
+        self._subscribers = set()
+        self.seq = 0
+        self.closed = False
+        # A hub whose seq numbers are not the only ones a client may have
+        # seen (one per process worker) sends a reset instead of replaying.
+        self.replay = replay
+
+    def publish(self, op, task_id, task=None, changes=None):
+        with self._lock:
+            self.seq += 1
+            event = {"seq": self.seq, "op": op, "id": task_id}
+            if task is not None:
+                event["task"] = task
+            if changes is not None:
+                event["changes"] = changes
+            self._events.append(event)
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(event)
+            except queue.Full:
+                # A client that stopped reading gets told to resync instead of
+                # holding the publisher up.
+                subscription.overflowed = True
+        return event
+
+    def subscribe(self):
+        subscription = Subscription(self)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def events_since(self, seq):
+        with self._lock:
+            if not self.replay or seq > self.seq:
+                return None
+            if seq == self.seq:
+                return []
+            if not self._events or self._events[0]["seq"] > seq + 1:
+                return None
+            return [event for event in self._events if event["seq"] > seq]
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(CLOSED)
+            except queue.Full:
+                subscription.overflowed = True
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+class ChangeRelay:
+    # Process workers each publish into their own hub, so a write made in one
+    # worker would never reach streams held by another. The relay polls the
+    # shared change counter and republishes every change it finds: rows as
+    # inserts carrying the whole task (clients treat them as upserts) and
+    # tombstones as deletes. A worker's own writes therefore arrive twice;
+    # applying either event again is harmless.
+    def __init__(self, hub, storage, interval=RELAY_INTERVAL):
+        self.hub = hub
+        self.storage = storage
+        self.interval = interval
+        self.version = storage.current_version()
+        self._thread = threading.Thread(target=self._run, name="change-relay", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def poll(self):
+        changes = self.storage.changes_since(self.version, limit=RELAY_LIMIT)
+        if changes["has_more"]:
+            # A bulk write (an import): have clients reload instead.
+            self.version = self.storage.current_version()
+            self.hub.publish("reset", None)
+            return
+        for task in changes["tasks"]:
+            task.pop("version")
+            self.hub.publish("insert", task["id"], task=task)
+        for task_id in changes["deleted"]:
+            self.hub.publish("delete", task_id)
+        self.version = changes["version"]
+
+    def _run(self):
+        while not self.hub.closed:
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Change relay poll failed")
+            time.sleep(self.interval)
+
+
+def format_sse(event, name="change"):
+    return f"id: {event['seq']}\nevent: {name}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# Keep the test run away from the real ~/.todolist (or %APPDATA%) directory.
+os.environ["APPDATA"] = tempfile.mkdtemp(prefix="todolist-tests-")
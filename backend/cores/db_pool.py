@@ -0,0 +1,219 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger("storage.pool")
+
+
+class ConnectionPool:
+    def __init__(self, db_path, size=5, timeout=5.0, health_check_interval=30.0, on_connect=None):
+        self.db_path = db_path
+        self.on_connect = on_connect
+        self.size = max(1, int(size))
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        # LIFO so the most recently used (warmest) connection is handed out first.
+        self._idle = queue.LifoQueue(maxsize=self.size)
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+        self._acquired = 0
+        self._timeouts = 0
+        self._wait_seconds = 0.0
+
+    def _create(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+        if self.on_connect is not None:
+            try:
+                self.on_connect(conn)
+            except Exception:
+                conn.close()
+                raise
+        logger.debug("Opened pooled connection to %s", self.db_path)
+        return conn
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._created -= 1
+
+    def _is_healthy(self, conn):
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self):
+        started = time.perf_counter()
+        try:
+            conn = self._acquire()
+        except TimeoutError:
+            with self._lock:
+                self._timeouts += 1
+            raise
+        waited = time.perf_counter() - started
+        with self._lock:
+            self._acquired += 1
+            self._wait_seconds += waited
+        return conn
+
+    def _acquire(self):
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+        try:
+            conn, last_used = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    return self._create()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            try:
+                conn, last_used = self._idle.get(timeout=self.timeout)
+            except queue.Empty:
+                raise TimeoutError(f"No database connection available after {self.timeout}s")
+
+        if time.monotonic() - last_used > self.health_check_interval and not self._is_healthy(conn):
+            logger.warning("Dropping unhealthy pooled connection")
+            self._discard(conn)
+            with self._lock:
+                self._created += 1
+            try:
+                return self._create()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return conn
+
+    def release(self, conn):
+        if self._closed:
+            self._discard(conn)
+            return
+        if conn.in_transaction:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                self._discard(conn)
+                return
+        try:
+            self._idle.put_nowait((conn, time.monotonic()))
+        except queue.Full:
+            self._discard(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            with conn:
+                yield conn
+        finally:
+            self.release(conn)
+
+    def prewarm(self, count=1):
+        conns = []
+        try:
+            for _ in range(min(count, self.size)):
+                conns.append(self.acquire())
+        finally:
+            for conn in conns:
+                self.release(conn)
+
+    def stats(self):
+        with self._lock:
+            created = self._created
+            acquired = self._acquired
+            timeouts = self._timeouts
+            wait_seconds = self._wait_seconds
+        idle = self._idle.qsize()
+        return {
+            "size": self.size,
+            "open": created,
+            "idle": idle,
+            "in_use": created - idle,
+            "acquired": acquired,
+            "timeouts": timeouts,
+            "wait_seconds": wait_seconds
+        }
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+        logger.debug("Connection pool for %s closed", self.db_path)
+
+    def reset_after_fork(self):
+        # SQLite handles must not cross a fork: forget the inherited ones
+        # without closing them (that would touch the parent's state) and
+        # start over with fresh connections.
+        self._idle = queue.LifoQueue(maxsize=self.size)
+        self._lock = threading.Lock()
+        self._created = 0
+        self._acquired = 0
+        self._timeouts = 0
+        self._wait_seconds = 0.0
+
+    @property
+    def closed(self):
+        return self._closed
+
+
+class WalCheckpointer:
+    def __init__(self, pool, interval=60.0, truncate_bytes=32 * 1024 * 1024):
+        self.pool = pool
+        self.interval = interval
+        self.truncate_bytes = truncate_bytes
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="wal-checkpoint", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.checkpoint()
+            except Exception as exc:
+                logger.warning("WAL checkpoint failed: %s", exc)
+
+    def wal_size(self):
+        try:
+            return os.path.getsize(f"{self.pool.db_path}-wal")
+        except OSError:
+            return 0
+
+    def checkpoint(self):
+        # PASSIVE never blocks writers; fall back to TRUNCATE once the WAL
+        # has grown past the limit so the file is actually shrunk on disk.
+        mode = "TRUNCATE" if self.truncate_bytes > 0 and self.wal_size() > self.truncate_bytes else "PASSIVE"
+        with self.pool.connection() as conn:
+            busy, log_frames, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+        logger.debug("WAL checkpoint %s: busy=%s log=%s checkpointed=%s", mode, busy, log_frames, checkpointed)
+        return busy, log_frames, checkpointed
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
@@ -1,59 +1,240 @@
 import sqlite3
 import logging
-from logging.handlers import RotatingFileHandler
-from app_paths import get_data_dir, get_logs_dir
+from app_paths import get_data_dir
+from settings_store import get_storage_settings
+from migrations import Migration, migrate
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-
-file_handler = RotatingFileHandler(
-    f"{get_logs_dir()}/app.log", maxBytes=1024*1024, backupCount=5, encoding="utf-8"
-)
-file_handler.setFormatter(
-    logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-)
-logger.addHandler(file_handler)
-
-def SQLinit(name: str):
+
+JOURNAL_MODES = ("WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY")
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+TEMP_STORES = ("DEFAULT", "FILE", "MEMORY")
+
+# Matched to the filters and sort orders built in task_query.build_list_query.
+TASK_INDEXES = {
+    "idx_tasks_completed_due": "CREATE INDEX IF NOT EXISTS idx_tasks_completed_due ON tasks (completed, due_date)",
+    "idx_tasks_category_priority": "CREATE INDEX IF NOT EXISTS idx_tasks_category_priority ON tasks (category, priority)",
+    "idx_tasks_priority": "CREATE INDEX IF NOT EXISTS idx_tasks_priority ON tasks (priority)",
+    "idx_tasks_due_date": "CREATE INDEX IF NOT EXISTS idx_tasks_due_date ON tasks (due_date)",
+    "idx_tasks_version": "CREATE INDEX IF NOT EXISTS idx_tasks_version ON tasks (version)"
+}
+
+
+def _choice(value, allowed, default):
+    value = str(value or "").upper()
+    return value if value in allowed else default
+
+
+def apply_journal_mode(conn, profile):
+    mode = _choice(profile.get("journal_mode"), JOURNAL_MODES, "WAL")
+    return conn.execute(f"PRAGMA journal_mode = {mode}").fetchone()[0]
+
+
+def apply_connection_pragmas(conn, profile):
+    synchronous = _choice(profile.get("synchronous"), SYNCHRONOUS_MODES, "NORMAL")
+    temp_store = _choice(profile.get("temp_store"), TEMP_STORES, "MEMORY")
+    conn.execute(f"PRAGMA synchronous = {synchronous}")
+    conn.execute(f"PRAGMA temp_store = {temp_store}")
+    conn.execute(f"PRAGMA cache_size = {int(profile.get('cache_size', -8000))}")
+    conn.execute(f"PRAGMA mmap_size = {int(profile.get('mmap_size', 0))}")
+    conn.execute(f"PRAGMA wal_autocheckpoint = {int(profile.get('wal_autocheckpoint', 1000))}")
+    conn.execute(f"PRAGMA journal_size_limit = {int(profile.get('journal_size_limit', -1))}")
+
+
+FTS_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+        INSERT INTO tasks_fts (rowid, description, details) VALUES (new.id, new.description, new.details);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+        INSERT INTO tasks_fts (tasks_fts, rowid, description, details)
+        VALUES ('delete', old.id, old.description, old.details);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF description, details ON tasks BEGIN
+        INSERT INTO tasks_fts (tasks_fts, rowid, description, details)
+        VALUES ('delete', old.id, old.description, old.details);
+        INSERT INTO tasks_fts (rowid, description, details) VALUES (new.id, new.description, new.details);
+    END
+    """
+)
+
+
+# Every write bumps the single-row change_counter and stamps the row (or its
+# tombstone) with the new value, so /api/changes can answer "what changed
+# since version N" from the version indexes alone.
+VERSION_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_version_insert AFTER INSERT ON tasks BEGIN
+        UPDATE change_counter SET version = version + 1 WHERE id = 1;
+        UPDATE tasks SET version = (SELECT version FROM change_counter WHERE id = 1) WHERE id = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_version_update
+    AFTER UPDATE OF description, details, completed, due_date, category, priority, color ON tasks BEGIN
+        UPDATE change_counter SET version = version + 1 WHERE id = 1;
+        UPDATE tasks SET version = (SELECT version FROM change_counter WHERE id = 1) WHERE id = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_version_delete AFTER DELETE ON tasks BEGIN
+        UPDATE change_counter SET version = version + 1 WHERE id = 1;
+        INSERT OR REPLACE INTO task_tombstones (id, version)
+        VALUES (old.id, (SELECT version FROM change_counter WHERE id = 1));
+    END
+    """
+)
+
+
+# Per-row insert triggers that bulk imports replace with set-based statements.
+BULK_INSERT_TRIGGERS = {
+    "tasks_version_insert": VERSION_TRIGGERS[0],
+    "tasks_fts_insert": FTS_TRIGGERS[0]
+}
+
+
+def table_columns(cursor, table):
+    return {row[1] for row in cursor.execute(f"PRAGMA table_info({table})").fetchall()}
+
+
+def create_tasks_table(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS tasks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        description TEXT NOT NULL,
+        details TEXT,
+        completed BOOLEAN DEFAULT 0,
+        due_date DATE,
+        category TEXT DEFAULT 'personal',
+        priority TEXT DEFAULT 'medium',
+        color TEXT,
+        version INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    # Databases from before these columns existed.
+    existing_columns = table_columns(cursor, "tasks")
+    if "category" not in existing_columns:
+        cursor.execute("ALTER TABLE tasks ADD COLUMN category TEXT DEFAULT 'personal'")
+    if "priority" not in existing_columns:
+        cursor.execute("ALTER TABLE tasks ADD COLUMN priority TEXT DEFAULT 'medium'")
+    if "color" not in existing_columns:
+        cursor.execute("ALTER TABLE tasks ADD COLUMN color TEXT")
+
+
+def backfill_defaults(cursor):
+    cursor.execute("UPDATE tasks SET category = 'personal' WHERE category IS NULL")
+    cursor.execute("UPDATE tasks SET priority = 'medium' WHERE priority IS NULL")
+
+
+def init_versioning(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS change_counter (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS task_tombstones (
+        id INTEGER PRIMARY KEY,
+        version INTEGER NOT NULL
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tombstones_version ON task_tombstones (version)")
+    cursor.execute("INSERT OR IGNORE INTO change_counter (id, version) VALUES (1, 0)")
+    if "version" not in table_columns(cursor, "tasks"):
+        cursor.execute("ALTER TABLE tasks ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        # Rows that predate versioning all become part of version 1.
+        cursor.execute("UPDATE change_counter SET version = 1 WHERE id = 1 AND version = 0")
+        cursor.execute("UPDATE tasks SET version = 1")
+    for trigger_sql in VERSION_TRIGGERS:
+        cursor.execute(trigger_sql)
+
+
+def has_fts(conn):
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tasks_fts'").fetchone()
+    return row is not None
+
+
+def create_indexes(cursor):
+    for index_sql in TASK_INDEXES.values():
+        cursor.execute(index_sql)
+
+
+def init_fts(cursor):
+    if has_fts(cursor.connection):
+        return True
+    try:
+        # trigram does substring matching for every script, which covers prefix
+        # search and CJK text that has no spaces between words.
+        cursor.execute("""
+        CREATE VIRTUAL TABLE tasks_fts USING fts5(
+            description, details, content='tasks', content_rowid='id', tokenize='trigram'
+        )
+        """)
+    except sqlite3.OperationalError as e:
+        logger.warning("Full-text search unavailable, falling back to LIKE: %s", e)
+        return False
+    for trigger_sql in FTS_TRIGGERS:
+        cursor.execute(trigger_sql)
+    cursor.execute("INSERT INTO tasks_fts (tasks_fts) VALUES ('rebuild')")
+    return True
+
+
+def repair_fts(conn):
+    # Migration 5 is stamped even where this SQLite has no FTS5 or trigram
+    # tokenizer, so later starts check for the table and try again.
+    if has_fts(conn):
+        return False
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        created = init_fts(cursor)
+        cursor.execute("COMMIT")
+    except BaseException:
+        cursor.execute("ROLLBACK")
+        raise
+    if created:
+        logger.info("Full-text search index created")
+    return created
+
+
+# Append new steps here; never renumber or edit one that has shipped. Steps
+# must also cope with databases created before user_version was tracked.
+MIGRATIONS = (
+    Migration(1, "create tasks table", create_tasks_table),
+    Migration(2, "backfill category and priority", backfill_defaults),
+    Migration(3, "row versions and tombstones", init_versioning),
+    Migration(4, "task indexes", create_indexes),
+    Migration(5, "full-text search", init_fts)
+)
+
+
+def SQLinit(name: str, profile=None):
     try:
+        profile = profile or get_storage_settings()
         data_dir = get_data_dir()
         db_path = f"{data_dir}/{name}.db"
         conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS tasks (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            description TEXT NOT NULL,
-            details TEXT,
-            completed BOOLEAN DEFAULT 0,
-            due_date DATE,
-            category TEXT DEFAULT 'personal',
-            priority TEXT DEFAULT 'medium',
-            color TEXT
-        )
-        """)
-
-        cursor.execute("PRAGMA table_info(tasks)")
-        existing_columns = {row[1] for row in cursor.fetchall()}
-        if "category" not in existing_columns:
-            cursor.execute("ALTER TABLE tasks ADD COLUMN category TEXT DEFAULT 'personal'")
-        if "priority" not in existing_columns:
-            cursor.execute("ALTER TABLE tasks ADD COLUMN priority TEXT DEFAULT 'medium'")
-        if "color" not in existing_columns:
-            cursor.execute("ALTER TABLE tasks ADD COLUMN color TEXT")
-
-        cursor.execute("UPDATE tasks SET category = 'personal' WHERE category IS NULL")
-        cursor.execute("UPDATE tasks SET priority = 'medium' WHERE priority IS NULL")
-
-        conn.commit()
+        journal_mode = apply_journal_mode(conn, profile)
+        apply_connection_pragmas(conn, profile)
+        # An up-to-date database costs one PRAGMA user_version read here,
+        # plus a sqlite_master lookup for the search index.
+        applied = migrate(conn, MIGRATIONS)
+        repaired = 5 not in applied and repair_fts(conn)
+        if applied or repaired:
+            conn.execute("PRAGMA optimize")
         conn.close()
 
-        logger.debug(f"Database '{name}.db' initialized successfully at {db_path}")
+        logger.debug("Database '%s.db' initialized successfully at %s (journal_mode=%s, migrations=%s)",
+                     name, db_path, journal_mode, applied)
         return db_path
 
     except Exception as e:
-        logger.error(f"Error initializing database: {e}")
+        logger.error("Error initializing database: %s", e)
         raise
 
 def get_db_path(name: str) -> str:
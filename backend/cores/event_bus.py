@@ -0,0 +1,129 @@
+import json
+import logging
+import threading
+import time
+from urllib import request as urlrequest
+from change_feed import CLOSED
+import settings_store
+
+logger = logging.getLogger("todolist.events")
+
+# {"settings": dict, "changed": set of top-level keys}
+SETTINGS = "settings"
+# Change feed events: {"seq", "op", "id", "task"/"changes"}, or {"op": "reset"}
+# when the listener fell behind and should re-read everything.
+TASKS = "tasks"
+REMOTE_RETRY_SECONDS = (1, 2, 5, 10, 30)
+
+
+class EventBus:
+    # Callbacks run synchronously on the publishing thread; nothing here
+    # wakes up unless something was published.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, topic, callback):
+        with self._lock:
+            self._subscribers[topic] = self._subscribers.get(topic, ()) + (callback,)
+
+        def unsubscribe():
+            with self._lock:
+                self._subscribers[topic] = tuple(
+                    item for item in self._subscribers.get(topic, ()) if item is not callback
+                )
+        return unsubscribe
+
+    def publish(self, topic, payload):
+        for callback in self._subscribers.get(topic, ()):
+            try:
+                callback(payload)
+            except Exception:
+                logger.exception("Event bus subscriber failed on %s", topic)
+
+
+bus = EventBus()
+_connect_lock = threading.Lock()
+_settings_connected = False
+
+
+def connect_settings():
+    global _settings_connected
+    with _connect_lock:
+        if _settings_connected:
+            return
+        _settings_connected = True
+    settings_store.subscribe(lambda settings, changed: bus.publish(SETTINGS, {"settings": settings, "changed": changed}))
+
+
+def _pump_storage(storage):
+    subscription = storage.changes.subscribe()
+    try:
+        while True:
+            # Blocks without a timeout: no events, no wakeups.
+            event = subscription.get()
+            if event is CLOSED:
+                return
+            if subscription.overflowed:
+                subscription.overflowed = False
+                event = {"op": "reset"}
+            if event["op"] == "settings":
+                continue
+            bus.publish(TASKS, event)
+    finally:
+        subscription.close()
+
+
+def connect_storage(storage):
+    # Same process as the server: forward its change feed onto the bus.
+    thread = threading.Thread(target=_pump_storage, args=(storage,), name="event-bus-storage", daemon=True)
+    thread.start()
+    return thread
+
+
+def iter_sse(lines):
+    name, data = "message", []
+    for raw in lines:
+        line = raw.decode("utf-8").rstrip("\r\n")
+        if not line:
+            if data:
+                yield name, "\n".join(data)
+            name, data = "message", []
+        elif line.startswith("event:"):
+            name = line[6:].strip()
+        elif line.startswith("data:"):
+            data.append(line[5:].lstrip())
+
+
+def _follow_remote(url):
+    last_id = None
+    failures = 0
+    while True:
+        headers = {"Accept": "text/event-stream"}
+        if last_id is not None:
+            headers["Last-Event-ID"] = str(last_id)
+        try:
+            with urlrequest.urlopen(urlrequest.Request(url, headers=headers)) as response:
+                failures = 0
+                for name, data in iter_sse(response):
+                    event = json.loads(data)
+                    last_id = event.get("seq", last_id)
+                    if name == "settings":
+                        # The server process saved settings.json; re-read it here.
+                        settings_store.check_for_changes()
+                    elif name == "reset":
+                        bus.publish(TASKS, {"op": "reset"})
+                    elif name == "change":
+                        bus.publish(TASKS, event)
+        except Exception as exc:
+            logger.debug("Change feed %s dropped: %s", url, exc)
+        delay = REMOTE_RETRY_SECONDS[min(failures, len(REMOTE_RETRY_SECONDS) - 1)]
+        failures += 1
+        time.sleep(delay)
+
+
+def connect_remote(events_url):
+    # Server in another process: follow its /api/events stream instead.
+    thread = threading.Thread(target=_follow_remote, args=(events_url,), name="event-bus-remote", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,98 @@
+import atexit
+import logging
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from app_paths import get_logs_dir
+from settings_store import get_logging_settings
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+# Loggers that get the queue handler; children such as storage.pool propagate
+# into them. Everything under todolist goes to backend.log, the rest to app.log.
+APP_LOGGERS = ("storage", "dbinit", "todolist")
+BACKEND_PREFIX = "todolist"
+
+_lock = threading.Lock()
+_queue_handler = None
+_listener = None
+
+
+def _is_backend(record):
+    return record.name == BACKEND_PREFIX or record.name.startswith(BACKEND_PREFIX + ".")
+
+
+def _file_handler(filename, settings):
+    handler = RotatingFileHandler(
+        f"{get_logs_dir()}/{filename}",
+        maxBytes=settings["max_bytes"],
+        backupCount=settings["backup_count"],
+        encoding="utf-8",
+        delay=True
+    )
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    return handler
+
+
+def _level(value, default=logging.INFO):
+    level = logging.getLevelName(str(value).upper())
+    return level if isinstance(level, int) else default
+
+
+def apply_levels(settings=None):
+    settings = settings or get_logging_settings()
+    default_level = _level(settings["level"])
+    for name in APP_LOGGERS:
+        logging.getLogger(name).setLevel(default_level)
+    for name, level in settings["loggers"].items():
+        logging.getLogger(name).setLevel(_level(level, default_level))
+
+
+def setup_logging(settings=None):
+    # Request threads only put records on the queue; the listener thread is
+    # the one place that formats, writes and rotates the files.
+    global _queue_handler, _listener
+    with _lock:
+        if _listener is not None:
+            return _listener
+        settings = settings or get_logging_settings()
+        app_handler = _file_handler("app.log", settings)
+        app_handler.addFilter(lambda record: not _is_backend(record))
+        backend_handler = _file_handler("backend.log", settings)
+        backend_handler.addFilter(_is_backend)
+
+        log_queue = queue.SimpleQueue()
+        _queue_handler = QueueHandler(log_queue)
+        _listener = QueueListener(log_queue, app_handler, backend_handler)
+        for name in APP_LOGGERS:
+            logging.getLogger(name).addHandler(_queue_handler)
+        apply_levels(settings)
+        _listener.start()
+        atexit.register(shutdown_logging)
+        return _listener
+
+
+def shutdown_logging():
+    global _queue_handler, _listener
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        for name in APP_LOGGERS:
+            logging.getLogger(name).removeHandler(_queue_handler)
+        _queue_handler = None
+        _listener = None
+
+
+def reset_after_fork():
+    # The listener thread did not survive the fork; give the child its own.
+    global _lock, _queue_handler, _listener
+    _lock = threading.Lock()
+    if _listener is None:
+        return
+    for name in APP_LOGGERS:
+        logging.getLogger(name).removeHandler(_queue_handler)
+    _queue_handler = None
+    _listener = None
+    setup_logging()
@@ -27,17 +27,65 @@ json 格式：
 """
 
 
+import sys
 from storage import SQLStorage
+from dbinit import SQLinit
+from log_setup import setup_logging
 from dateutil import parser
+from task_import import ImportAborted, detect_format, iter_records
+
+EVENT_MESSAGES = {
+    "add": "Task ID {id} added.",
+    "done": "Task ID {id} marked as done.",
+    "remove": "Task ID {id} removed.",
+    "reopen": "Task ID {id} reopened.",
+    "update": "Task ID {id} updated."
+}
+
+def render_event(event):
+    message = EVENT_MESSAGES.get(event.op)
+    if message is None:
+        return
+    if not event.ok:
+        print(f"Task ID {event.task_id} not found.")
+        return
+    print(message.format(id=event.task_id))
+
+def print_progress(report):
+    print(f"\rImported {report.imported} tasks ({report.rate:.0f} rows/s)", end="", flush=True)
+
+def import_file(path, fmt=None, strict=False):
+    SQLinit("tasks")
+    storage = SQLStorage()
+    try:
+        fmt = detect_format(filename=path, requested=fmt)
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            report = storage.import_tasks(iter_records(f, fmt), strict=strict, progress=print_progress)
+    except ImportAborted as exc:
+        print(f"\nImport aborted, nothing was saved. {exc}")
+        return 1
+    except (OSError, ValueError) as exc:
+        print(f"\nImport failed, nothing was saved. {exc}")
+        return 1
+    finally:
+        storage.close()
+    print(f"\nImported {report.imported} tasks, skipped {report.skipped}, "
+          f"in {report.seconds:.2f}s ({report.rate:.0f} rows/s).")
+    for error in report.errors:
+        print(f"  row {error['row']}: {error['error']}")
+    return 0
+
 
 def main():
+    storage = SQLStorage()
+    storage.observe(render_event)
     while True:
-        storage = SQLStorage()
         input_cmd = input("Command (add/list/done/remove/exit): ").strip().lower()
 
         if(input_cmd == "exit"):
             """storage.save_tasks(storage.get_tasks())
             print("Tasks saved. Exiting.")"""
+            storage.close()
             break
 
         elif(input_cmd == "add"):
@@ -61,7 +109,8 @@ def main():
             storage.add_task(task)
 
         elif(input_cmd == "list"):
-            storage.list_tasks()
+            for row in storage.list_tasks():
+                print(row)
         elif(input_cmd == "done"):
             task_id = input("Enter Task ID to mark as done: ")
             if(task_id.isdigit()):
@@ -78,4 +127,12 @@ def main():
             print("Invalid command. Please try again.")
 
 if __name__ == "__main__":
+    setup_logging()
+    args = sys.argv[1:]
+    if args and args[0] == "import":
+        if len(args) < 2:
+            print("Usage: main.py import <file> [--format json|ndjson|csv] [--strict]")
+            sys.exit(2)
+        fmt = args[args.index("--format") + 1] if "--format" in args[:-1] else None
+        sys.exit(import_file(args[1], fmt=fmt, strict="--strict" in args))
     main()
\ No newline at end of file
@@ -0,0 +1,67 @@
+import logging
+
+logger = logging.getLogger("dbinit.migrations")
+
+
+class Migration:
+    __slots__ = ("version", "name", "apply")
+
+    def __init__(self, version, name, apply):
+        self.version = version
+        self.name = name
+        self.apply = apply
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def latest_version(migrations):
+    return migrations[-1].version if migrations else 0
+
+
+def check_migrations(migrations):
+    versions = [migration.version for migration in migrations]
+    if versions != list(range(1, len(versions) + 1)):
+        raise ValueError(f"Migrations must be numbered 1..n in order, got {versions}")
+
+
+def migrate(conn, migrations):
+    # Each step runs in its own BEGIN IMMEDIATE transaction together with the
+    # user_version bump, so a failed step leaves the database at the previous
+    # version and the next start retries just that step.
+    check_migrations(migrations)
+    current = schema_version(conn)
+    target = latest_version(migrations)
+    if current >= target:
+        if current > target:
+            logger.warning("Database schema version %s is newer than this build (%s)", current, target)
+        return []
+    applied = []
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    try:
+        for migration in migrations:
+            if migration.version <= current:
+                continue
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                # Another process may have migrated while we waited for the lock.
+                current = schema_version(conn)
+                if migration.version <= current:
+                    cursor.execute("COMMIT")
+                    continue
+                migration.apply(cursor)
+                cursor.execute(f"PRAGMA user_version = {int(migration.version)}")
+                cursor.execute("COMMIT")
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                logger.error("Migration %s (%s) failed", migration.version, migration.name)
+                raise
+            current = migration.version
+            applied.append(migration.version)
+            logger.info("Applied migration %s: %s", migration.version, migration.name)
+    finally:
+        conn.isolation_level = isolation_level
+    return applied
@@ -0,0 +1,87 @@
+import threading
+import logging
+import re
+
+logger = logging.getLogger("storage.plan")
+
+PLANNED_STATEMENTS = ("SELECT", "UPDATE", "DELETE")
+# The trace callback sees SQL with the values already bound in, so plans are
+# keyed by the statement's shape and the number of shapes kept is capped.
+MAX_PLANS = 256
+LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+# Filtered statements that are expected to read the whole table. Search
+# terms shorter than FTS_MIN_TERM (any CJK word of one or two characters,
+# say) cannot use tasks_fts and fall back to LIKE '%term%', which no index
+# can serve.
+ALLOWED_SCANS = ("LIKE ? ESCAPE ?",)
+
+
+def explain(conn, sql, params=()):
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def statement_shape(sql):
+    shape = LITERAL.sub("?", " ".join(sql.split()))
+    return IN_LIST.sub("(?)", shape)
+
+
+def is_full_scan(detail):
+    # "SCAN tasks" walks the whole table; "SCAN tasks USING [COVERING] INDEX"
+    # at least reads rows in index order and is left alone, as are the
+    # schema lookups on sqlite_master.
+    if not detail.startswith("SCAN ") or detail.startswith("SCAN sqlite_"):
+        return False
+    return " INDEX " not in f"{detail} "
+
+
+class QueryPlanRecorder:
+    def __init__(self):
+        self.plans = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._full = False
+
+    def install(self, conn):
+        conn.set_trace_callback(self._record)
+
+    def _record(self, sql):
+        words = sql.split(None, 1)
+        if words and words[0].upper() in PLANNED_STATEMENTS:
+            shape = statement_shape(sql)
+            with self._lock:
+                if shape in self.plans or shape in self._pending:
+                    return
+                if len(self.plans) + len(self._pending) >= MAX_PLANS:
+                    if not self._full:
+                        self._full = True
+                        logger.warning("Query plan recorder is full at %d statements", MAX_PLANS)
+                    return
+                self._pending[shape] = sql
+
+    def check(self, conn):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        found = []
+        for shape, sql in pending.items():
+            plan = explain(conn, sql)
+            with self._lock:
+                self.plans[shape] = plan
+            if self._is_violation(shape, plan):
+                logger.warning("Query plan regressed to a full scan: %s -> %s", shape, plan)
+                found.append((shape, plan))
+        return found
+
+    def _is_violation(self, sql, plan):
+        # Unfiltered reads (count_by_status, an unfiltered list) are full
+        # table reads by definition.
+        if " WHERE " not in f" {' '.join(sql.upper().split())} ":
+            return False
+        if any(marker in statement_shape(sql) for marker in ALLOWED_SCANS):
+            return False
+        return any(is_full_scan(detail) for detail in plan)
+
+    def violations(self):
+        with self._lock:
+            plans = dict(self.plans)
+        return [(sql, plan) for sql, plan in plans.items() if self._is_violation(sql, plan)]
@@ -1,14 +1,29 @@
+import io
+import argparse
 import os
+import csv
+import atexit
+import hashlib
+import time
+import threading
 import flask
 import logging
 import traceback
 from flask_cors import CORS
+from werkzeug.exceptions import HTTPException
 from storage import SQLStorage
+from change_feed import CLOSED, ChangeRelay, format_sse
+from task_import import ImportAborted, detect_format, iter_records
+from task_json import choose_format, encode_task_list, mimetype_for, stream_ndjson, stream_task_list
+from task_query import parse_limit, SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT
 from dbinit import SQLinit
-from settings_store import load_settings, save_settings
-from flask import request, send_from_directory
-from logging.handlers import RotatingFileHandler
-from app_paths import get_resource_path, get_project_root, get_logs_dir
+from settings_store import load_settings, save_settings, settings_version, subscribe as subscribe_settings
+from flask import request
+from app_paths import get_resource_path, get_project_root
+from log_setup import setup_logging, reset_after_fork as reset_logging_after_fork
+from serving import SERVING_MODES, create_server
+from metrics import MetricsRegistry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from static_files import StaticManifest
 
 def resolve_frontend_dist():
     packaged_dist = get_resource_path("frontend_dist")
@@ -19,35 +34,135 @@ def resolve_frontend_dist():
         return dev_dist
     return None
 
-FRONTEND_DIST = resolve_frontend_dist()
+logger = logging.getLogger("todolist.server")
+# Routes live on a blueprint so importing this module is cheap; create_app()
+# does the database, logging and frontend work.
+api = flask.Blueprint("api", __name__)
+_app_lock = threading.RLock()
+_app = None
+_app_name = None
+_app_teardown = []
 
-app = flask.Flask(
-    __name__,
-    static_folder=FRONTEND_DIST if FRONTEND_DIST else None,
-    static_url_path=""
+metrics = MetricsRegistry()
+request_seconds = metrics.histogram(
+    "todolist_http_request_duration_seconds", "Time to produce a response, by route.", ("method", "route", "status")
 )
-CORS(app)
-
-logger = logging.getLogger("todolist.server")
-logger.setLevel(logging.DEBUG)
-file_handler = RotatingFileHandler(
-    f"{get_logs_dir()}/backend.log", maxBytes=1024 * 1024, backupCount=5, encoding="utf-8"
+storage_seconds = metrics.histogram(
+    "todolist_storage_operation_duration_seconds", "SQLStorage operation latency.", ("op",)
 )
-file_handler.setFormatter(
-    logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+storage_rows = metrics.counter("todolist_storage_rows_total", "Rows read or written by SQLStorage.", ("op",))
+storage_misses = metrics.counter("todolist_storage_not_found_total", "Operations on a missing task id.", ("op",))
+metrics.gauge_callback(
+    "todolist_pool_connections", "Pooled SQLite connections by state.",
+    lambda: {(state,): storage.pool.stats()[state] for state in ("open", "idle", "in_use")}, ("state",)
 )
-logger.addHandler(file_handler)
-
-SQLinit("tasks")
-storage = SQLStorage("tasks") 
-print("server.py loaded!")
+metrics.gauge_callback("todolist_pool_size", "Configured pool size.", lambda: storage.pool.size)
+metrics.counter_callback(
+    "todolist_pool_acquire_total", "Connections handed out by the pool.", lambda: storage.pool.stats()["acquired"]
+)
+metrics.counter_callback(
+    "todolist_pool_timeouts_total", "Checkouts that gave up waiting.", lambda: storage.pool.stats()["timeouts"]
+)
+metrics.counter_callback(
+    "todolist_pool_wait_seconds_total", "Time spent waiting for a connection.",
+    lambda: storage.pool.stats()["wait_seconds"]
+)
+metrics.gauge_callback(
+    "todolist_sse_subscribers", "Open /api/events streams.", lambda: storage.changes.subscriber_count
+)
+
+
+def record_storage_event(event):
+    storage_seconds.observe(event.duration, event.op)
+    if event.rowcount:
+        storage_rows.inc(event.op, amount=event.rowcount)
+    elif not event.ok:
+        storage_misses.inc(event.op)
+
+
+@api.before_app_request
+def start_request_timer():
+    flask.g.request_started = time.perf_counter()
+
+
+@api.after_app_request
+def record_request_time(response):
+    started = flask.g.pop("request_started", None)
+    if started is not None:
+        # The route pattern, not the path, keeps the label set bounded.
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        request_seconds.observe(time.perf_counter() - started, request.method, route, str(response.status_code))
+    return response
+
+
+def not_modified(etag):
+    if etag in request.if_none_match:
+        response = flask.Response(status=304)
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+    return None
+
+
+def with_etag(response, etag):
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def list_etag(version, fmt):
+    query = request.query_string or b""
+    digest = hashlib.sha1(query).hexdigest()[:12]
+    return f"tasks-{version}-{fmt}-{digest}"
+
+
+def list_filters(args):
+    return {
+        "sort": args.get("sort", "id"),
+        "status": args.get("status"),
+        "category": args.get("category"),
+        "priority": args.get("priority"),
+        "q": (args.get("q") or "").strip() or None,
+        "due_before": args.get("due_before"),
+        "due_after": args.get("due_after")
+    }
+
+
+def stream_tasks(args, fmt):
+    if args.get("limit") or args.get("cursor"):
+        raise ValueError("limit and cursor are not supported when streaming")
+    chunks = storage.iter_task_rows(**list_filters(args))
+    if fmt == "ndjson":
+        body = stream_ndjson(chunks)
+    else:
+        body = stream_task_list(chunks, fmt, counts=storage.count_by_status())
+    return flask.Response(body, mimetype=mimetype_for(fmt))
+
+
+@api.route("/api/metrics", methods=["GET"])
+def metrics_endpoint():
+    return flask.Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+@api.route("/api/health", methods=["GET"])
+def health():
+    # Constant time: one primary-key read plus in-memory pool counters.
+    status = {"status": "ok", "pool": storage.pool.stats()}
+    try:
+        status["db"] = {"ok": True, "version": storage.current_version()}
+    except Exception as exc:
+        logger.error("Health check failed: %s", exc)
+        status["status"] = "unavailable"
+        status["db"] = {"ok": False, "error": str(exc)}
+        return flask.jsonify(status), 503
+    return flask.jsonify(status)
 
 
-@app.route("/api/", methods=["POST"])
+@api.route("/api/", methods=["POST"])
 def index():
     return "Welcome to the To-Do List API!"
 
-@app.route("/api/add", methods=["POST"])
+@api.route("/api/add", methods=["POST"])
 def add_task():
     if request.is_json:
         data = flask.request.json
@@ -78,18 +193,79 @@ def add_task():
     task_id = storage.add_task(task)
     return flask.jsonify({"task_id": task_id})
 
-@app.route("/api/list", methods=["GET"])
+@api.route("/api/list", methods=["GET"])
 def list_tasks():
+    args = request.args
     try:
-        tasks = storage.list_task_flasks()
-        if tasks is None:
-            return flask.jsonify("No tasks found"), 404
-        return flask.jsonify({"tasks": tasks})
+        fmt = choose_format(args, request.headers.get("Accept"))
+    except ValueError as exc:
+        return flask.jsonify({"error": str(exc)}), 400
+    if fmt == "ndjson" or args.get("stream") in ("1", "true"):
+        try:
+            response = stream_tasks(args, fmt)
+        except ValueError as exc:
+            return flask.jsonify({"error": str(exc)}), 400
+        response.vary.add("Accept")
+        return response
+    # The change counter moves on every write, so it is enough to tell
+    # whether a cached list is still current without reading any rows.
+    etag = list_etag(storage.current_version(), fmt)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    try:
+        rows, next_cursor = storage.query_task_rows(
+            limit=parse_limit(args.get("limit")),
+            cursor=args.get("cursor"),
+            **list_filters(args)
+        )
+        body = encode_task_list(rows, fmt, next_cursor=next_cursor, counts=storage.count_by_status())
+        response = flask.Response(body, mimetype=mimetype_for(fmt))
+        response.vary.add("Accept")
+        return with_etag(response, etag)
+    except ValueError as exc:
+        return flask.jsonify({"error": str(exc)}), 400
     except Exception as exc:
-        logger.error(f"List tasks failed: {exc}\n{traceback.format_exc()}")
+        logger.error("List tasks failed: %s\n%s", exc, traceback.format_exc())
         return flask.jsonify({"error": "Failed to list tasks"}), 500
+
+@api.route("/api/export", methods=["GET"])
+def export_tasks():
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in ("ndjson", "objects"):
+        return flask.jsonify({"error": f"Invalid format: {fmt}"}), 400
+    try:
+        response = stream_tasks(request.args, fmt)
+    except ValueError as exc:
+        return flask.jsonify({"error": str(exc)}), 400
+    extension = "ndjson" if fmt == "ndjson" else "json"
+    response.headers["Content-Disposition"] = f"attachment; filename=tasks.{extension}"
+    return response
+
+@api.route("/api/search", methods=["GET"])
+def search_tasks():
+    q = (request.args.get("q") or "").strip()
+    if not q:
+        return flask.jsonify({"error": "Query is required"}), 400
+    try:
+        limit = parse_limit(request.args.get("limit"), SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT)
+    except ValueError as exc:
+        return flask.jsonify({"error": str(exc)}), 400
+    results = storage.search_tasks(q, limit=limit)
+    return flask.jsonify({"results": results, "fts": storage.fts_enabled})
+
+@api.route("/api/changes", methods=["GET"])
+def changes():
+    try:
+        since = int(request.args.get("since", 0))
+        limit = parse_limit(request.args.get("limit"))
+    except ValueError:
+        return flask.jsonify({"error": "since and limit must be integers"}), 400
+    if since < 0:
+        return flask.jsonify({"error": "since must not be negative"}), 400
+    return flask.jsonify(storage.changes_since(since, limit=limit))
 
-@app.route("/api/done", methods=["POST"])
+@api.route("/api/done", methods=["POST"])
 def done_task():
     if request.is_json:
         data = flask.request.json or {}
@@ -106,7 +282,7 @@ def done_task():
 
     return flask.jsonify({"message": f"Task {task_id} marked as done"})
 
-@app.route("/api/remove", methods=["POST"])
+@api.route("/api/remove", methods=["POST"])
 def remove_task():
     if request.is_json:
         data = flask.request.json or {}
@@ -123,7 +299,7 @@ def remove_task():
 
     return flask.jsonify({"message": f"Task {task_id} removed"})
 
-@app.route("/api/reopen", methods=["POST"])
+@api.route("/api/reopen", methods=["POST"])
 def reopen_task():
     if request.is_json:
         data = flask.request.json or {}
@@ -140,7 +316,7 @@ def reopen_task():
 
     return flask.jsonify({"message": f"Task {task_id} reopened"})
 
-@app.route("/api/update", methods=["POST"])
+@api.route("/api/update", methods=["POST"])
 def update_task():
     if request.is_json:
         data = flask.request.json or {}
@@ -170,10 +346,124 @@ def update_task():
     return flask.jsonify({"message": f"Task {task_id} updated"})
 
 
-@app.route("/api/settings", methods=["GET", "POST"])
+@api.route("/api/batch", methods=["POST"])
+def batch():
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return flask.jsonify({"error": "Expected a JSON object"}), 400
+    operations = data.get("operations")
+    atomic = bool(data.get("atomic", False))
+    try:
+        results, applied = storage.apply_batch(operations, atomic=atomic)
+    except ValueError as exc:
+        return flask.jsonify({"error": str(exc)}), 400
+    status = 200 if applied else 409
+    return flask.jsonify({"results": results, "applied": applied}), status
+
+
+@api.route("/api/import", methods=["POST"])
+def import_tasks():
+    upload = request.files.get("file")
+    try:
+        fmt = detect_format(
+            filename=upload.filename if upload else None,
+            content_type=upload.mimetype if upload else request.mimetype,
+            requested=request.args.get("format")
+        )
+    except ValueError as exc:
+        return flask.jsonify({"error": str(exc)}), 400
+    strict = request.args.get("strict") in ("1", "true")
+    stream = io.TextIOWrapper(upload.stream if upload else request.stream, encoding="utf-8-sig", newline="")
+    try:
+        report = storage.import_tasks(iter_records(stream, fmt), strict=strict)
+    except ImportAborted as exc:
+        return flask.jsonify({"error": str(exc), "imported": 0, "errors": [exc.error]}), 400
+    except (ValueError, UnicodeDecodeError, csv.Error) as exc:
+        return flask.jsonify({"error": f"Could not read {fmt} input: {exc}", "imported": 0}), 400
+    return flask.jsonify(report.to_dict())
+
+
+SSE_KEEPALIVE_SECONDS = 15
+
+
+def parse_last_event_id(value):
+    if value in (None, ""):
+        return None
+    try:
+        return max(0, int(value))
+    except ValueError:
+        return None
+
+
+def event_name(event):
+    # Bulk writes publish a single reset rather than one event per row;
+    # settings events only matter to the tray, the web UI ignores them.
+    return event["op"] if event["op"] in ("reset", "settings") else "change"
+
+
+def reset_frame(hub):
+    seq = hub.seq
+    return seq, format_sse({"seq": seq, "op": "reset"}, name="reset")
+
+
+def replay_events(hub, last_seq):
+    # Returns the seq the client is caught up to and the frames it missed.
+    if last_seq is None:
+        return hub.seq, []
+    backlog = hub.events_since(last_seq)
+    if backlog is None:
+        # Too far behind (or from before a restart): resync from /api/list.
+        seq, frame = reset_frame(hub)
+        return seq, [frame]
+    sent = backlog[-1]["seq"] if backlog else last_seq
+    return sent, [format_sse(event, name=event_name(event)) for event in backlog]
+
+
+@api.route("/api/events", methods=["GET"])
+def events():
+    hub = storage.changes
+    last_seq = parse_last_event_id(request.headers.get("Last-Event-ID") or request.args.get("last_event_id"))
+
+    def stream():
+        subscription = hub.subscribe()
+        try:
+            yield "retry: 3000\n\n"
+            sent, frames = replay_events(hub, last_seq)
+            yield from frames
+            while not hub.closed:
+                event = subscription.get(timeout=SSE_KEEPALIVE_SECONDS)
+                if event is CLOSED or hub.closed:
+                    break
+                if subscription.overflowed:
+                    subscription.overflowed = False
+                    sent, frame = reset_frame(hub)
+                    yield frame
+                    continue
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                if event["seq"] <= sent:
+                    continue
+                sent = event["seq"]
+                yield format_sse(event, name=event_name(event))
+        finally:
+            subscription.close()
+
+    return flask.Response(
+        stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@api.route("/api/settings", methods=["GET", "POST"])
 def settings():
     if request.method == "GET":
-        return flask.jsonify(load_settings())
+        etag = f"settings-{settings_version()}"
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+        return with_etag(flask.jsonify(load_settings()), etag)
 
     if request.is_json:
         data = flask.request.json or {}
@@ -187,22 +477,118 @@ def settings():
     save_settings({"language": language})
     return flask.jsonify({"language": language})
 
-if FRONTEND_DIST:
-    @app.route("/", defaults={"path": ""})
-    @app.route("/<path:path>")
-    def serve_frontend(path):
-        if path.startswith("api"):
-            return flask.jsonify({"error": "Not found"}), 404
-        full_path = os.path.join(FRONTEND_DIST, path)
-        if path and os.path.isfile(full_path):
-            return send_from_directory(FRONTEND_DIST, path)
-        return send_from_directory(FRONTEND_DIST, "index.html")
-
-@app.errorhandler(Exception)
+def serve_frontend(path):
+    if path.startswith("api"):
+        return flask.jsonify({"error": "Not found"}), 404
+    status, headers, body = frontend.respond(
+        path,
+        accept_encoding=request.headers.get("Accept-Encoding"),
+        if_none_match=request.headers.get("If-None-Match")
+    )
+    return flask.Response(body, status=status, headers=headers)
+
+@api.app_errorhandler(Exception)
 def handle_exception(error):
-    logger.error(f"Unhandled error: {error}\n{traceback.format_exc()}")
+    if isinstance(error, HTTPException):
+        # 404/405 and friends keep their status, as JSON like every other error.
+        return flask.jsonify({"error": error.name}), error.code
+    logger.error("Unhandled error: %s\n%s", error, traceback.format_exc())
     return flask.jsonify({"error": "Internal server error"}), 500
 
+
+def close_app():
+    global _app, _app_name
+    with _app_lock:
+        while _app_teardown:
+            _app_teardown.pop()()
+        # The next server.app / server.storage builds a fresh app.
+        for name in ("app", "storage", "frontend"):
+            globals().pop(name, None)
+        _app = None
+        _app_name = None
+
+
+def create_app(name="tasks"):
+    # One app (and one storage pool) per process: asking again for the same
+    # database returns it, asking for another one closes the old one first.
+    with _app_lock:
+        if _app is not None and _app_name == name:
+            return _app
+        close_app()
+        return _build_app(name)
+
+
+def _build_app(name):
+    global _app, _app_name, app, storage, frontend
+    setup_logging()
+    SQLinit(name)
+    storage = db = SQLStorage(name)
+    atexit.register(db.close)
+    _app_teardown.append(db.close)
+    _app_teardown.append(db.changes.close)
+    _app_teardown.append(lambda: atexit.unregister(db.close))
+    db.observe(record_storage_event)
+    # Lets a tray in another process pick up settings saved through the API.
+    _app_teardown.append(subscribe_settings(
+        lambda settings, changed: db.changes.publish("settings", None, changes=sorted(changed))
+    ))
+    frontend_dist = resolve_frontend_dist()
+    # Read and compressed once at startup; requests never touch the filesystem.
+    frontend = StaticManifest(frontend_dist) if frontend_dist else None
+
+    app = flask.Flask(__name__, static_folder=None)
+    CORS(app)
+    app.register_blueprint(api)
+    if frontend is not None:
+        app.add_url_rule("/", "serve_frontend", serve_frontend, defaults={"path": ""})
+        app.add_url_rule("/<path:path>", "serve_frontend", serve_frontend)
+    _app = app
+    _app_name = name
+    logger.debug("Created app for database %s", name)
+    return app
+
+
+def get_app():
+    with _app_lock:
+        if _app is None:
+            create_app()
+    return _app
+
+
+def __getattr__(name):
+    # server.app / server.storage / server.frontend build the app on first use.
+    if name in ("app", "storage", "frontend"):
+        get_app()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def after_fork():
+    reset_logging_after_fork()
+    storage.reset_after_fork()
+    # Writes made by the other workers reach this one's /api/events through
+    # the shared change counter.
+    ChangeRelay(storage.changes, storage).start()
+
+
+def serve(**overrides):
+    # Closing the change feed ends open /api/events streams so a drain does
+    # not wait out the keepalive loop.
+    application = get_app()
+    return create_server(application, on_drain=lambda: storage.changes.close(), after_fork=after_fork, **overrides)
+
+
 if __name__ == "__main__":
-    print("Starting Flask server...")
-    app.run(debug=True)
+    parser = argparse.ArgumentParser(description="Run the To-Do List API server.")
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--mode", choices=SERVING_MODES)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--debug", action="store_true", help="Flask development server with the reloader")
+    args = parser.parse_args()
+    if args.debug:
+        print("Starting Flask server...")
+        get_app().run(host=args.host, port=args.port, debug=True)
+    else:
+        http_server = serve(host=args.host, port=args.port, mode=args.mode, workers=args.workers)
+        print(f"Serving on {http_server.url} ({http_server.mode}, {http_server.workers} workers)")
+        http_server.serve_forever()
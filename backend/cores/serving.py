@@ -0,0 +1,248 @@
+import os
+import signal
+import socket
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.serving import BaseWSGIServer, ThreadedWSGIServer
+from werkzeug.wsgi import ClosingIterator
+from settings_store import get_server_settings
+
+logger = logging.getLogger("todolist.serving")
+
+SERVING_MODES = ("threaded", "pool", "processes")
+# Threads inside each forked worker, so one slow request does not stall it.
+WORKER_THREADS = 4
+
+
+def _exit_on_signal(signum, frame):
+    raise SystemExit(0)
+
+
+class InFlightTracker:
+    # Counts requests until their response body is closed, so a drain also
+    # waits for streamed bodies that are still being written.
+    def __init__(self, app):
+        self.app = app
+        self.count = 0
+        self._idle = threading.Condition()
+
+    def __call__(self, environ, start_response):
+        with self._idle:
+            self.count += 1
+        try:
+            body = self.app(environ, start_response)
+        except BaseException:
+            self._leave()
+            raise
+        return ClosingIterator(body, self._leave)
+
+    def _leave(self):
+        with self._idle:
+            self.count -= 1
+            if self.count == 0:
+                self._idle.notify_all()
+
+    def wait_idle(self, timeout):
+        with self._idle:
+            return self._idle.wait_for(lambda: self.count == 0, timeout=timeout)
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    # Same request handling as ThreadedWSGIServer, but on a fixed set of
+    # threads instead of one new thread per connection.
+    multithread = True
+
+    def __init__(self, host, port, app, workers, fd=None):
+        super().__init__(host, port, app, fd=fd)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="wsgi-worker")
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        # BaseWSGIServer also calls this from __init__ when given an fd.
+        executor = getattr(self, "executor", None)
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+def build_server(app, host, port, mode="threaded", workers=8, fd=None):
+    if mode == "pool":
+        return PooledWSGIServer(host, port, app, workers, fd=fd)
+    server = ThreadedWSGIServer(host, port, app, fd=fd)
+    server.daemon_threads = True
+    return server
+
+
+class AppServer:
+    def __init__(self, app, host="127.0.0.1", port=5000, mode="threaded", workers=8, drain_timeout=10.0,
+                 on_drain=None, after_fork=None):
+        if mode not in SERVING_MODES:
+            raise ValueError(f"Invalid serving mode: {mode}")
+        if mode == "processes" and not hasattr(os, "fork"):
+            logger.warning("Process workers need fork(); using the thread pool instead")
+            mode = "pool"
+        self.mode = mode
+        self.host = host
+        self.workers = max(1, int(workers))
+        self.drain_timeout = drain_timeout
+        self.on_drain = on_drain
+        self.after_fork = after_fork
+        self.tracker = InFlightTracker(app)
+        self._server = None
+        self._thread = None
+        self._socket = None
+        self._children = []
+        self._stopping = threading.Event()
+        self._stop_lock = threading.Lock()
+        self._stopped = False
+        if mode == "processes":
+            self._socket = socket.create_server((host, port), backlog=128, reuse_port=False)
+            self.port = self._socket.getsockname()[1]
+        else:
+            self._server = build_server(self.tracker, host, port, mode, self.workers)
+            self.port = self._server.server_port
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        if self.mode == "processes":
+            for _ in range(self.workers):
+                self._fork_worker()
+            return self
+        self._thread = threading.Thread(target=self._server.serve_forever, name="wsgi-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, _exit_on_signal)
+        self.start()
+        try:
+            if self.mode == "processes":
+                self._supervise()
+            else:
+                self._stopping.wait()
+        except (KeyboardInterrupt, SystemExit):
+            pass
+        finally:
+            self.stop()
+
+    def _fork_worker(self):
+        pid = os.fork()
+        if pid:
+            self._children.append(pid)
+            return
+        # Child: serve the inherited listening socket with a thread pool until
+        # the parent asks us to stop.
+        code = 0
+        try:
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            if self.after_fork is not None:
+                self.after_fork()
+            self._server = build_server(
+                self.tracker, self.host, self.port, "pool", WORKER_THREADS, fd=self._socket.fileno()
+            )
+            signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=self._drain_thread).start())
+            self._server.serve_forever()
+            self._drain_requests()
+        except Exception:
+            logger.exception("Worker %s failed", os.getpid())
+            code = 1
+        finally:
+            os._exit(code)
+
+    def _drain_thread(self):
+        self._server.shutdown()
+
+    def _supervise(self):
+        while self._children and not self._stopping.is_set():
+            try:
+                pid, status = os.waitpid(-1, 0)
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            if pid in self._children:
+                self._children.remove(pid)
+                if not self._stopping.is_set():
+                    logger.warning("Worker %s exited with status %s, restarting", pid, status)
+                    self._fork_worker()
+
+    def _drain_requests(self):
+        if self.on_drain is not None:
+            self.on_drain()
+        if not self.tracker.wait_idle(self.drain_timeout):
+            logger.warning("Stopped with %s requests still running after %ss", self.tracker.count, self.drain_timeout)
+        self._server.server_close()
+
+    def stop(self):
+        with self._stop_lock:
+            if self._stopped:
+                return
+            self._stopped = True
+        self._stopping.set()
+        if self.mode == "processes":
+            self._stop_children()
+            if self._socket is not None:
+                self._socket.close()
+                self._socket = None
+            return
+        # Stop accepting, let in-flight requests finish, then close.
+        if self._thread is not None:
+            self._server.shutdown()
+        self._drain_requests()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+        self._server = None
+
+    def _stop_children(self):
+        for pid in self._children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.drain_timeout + 1
+        while self._children and time.monotonic() < deadline:
+            for pid in list(self._children):
+                try:
+                    done, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    done = pid
+                if done:
+                    self._children.remove(pid)
+            time.sleep(0.05)
+        for pid in self._children:
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+        self._children = []
+
+
+def create_server(app, on_drain=None, after_fork=None, **overrides):
+    settings = {**get_server_settings(), **{key: value for key, value in overrides.items() if value is not None}}
+    return AppServer(
+        app,
+        host=settings["host"],
+        port=int(settings["port"]),
+        mode=settings["mode"],
+        workers=int(settings["workers"]),
+        drain_timeout=float(settings["drain_timeout"]),
+        on_drain=on_drain,
+        after_fork=after_fork
+    )
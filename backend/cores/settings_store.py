@@ -1,26 +1,195 @@
+import os
+import copy
 import json
+import logging
+import tempfile
+import threading
+import time
 from app_paths import get_settings_path
 
+logger = logging.getLogger("todolist.settings")
+
 
 DEFAULT_SETTINGS = {
-    "language": "en"
+    "language": "en",
+    "storage": {
+        "pool_size": 5,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -8000,
+        "mmap_size": 64 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "wal_autocheckpoint": 1000,
+        "journal_size_limit": 32 * 1024 * 1024,
+        "checkpoint_interval": 60,
+        "explain_queries": False
+    },
+    "server": {
+        "mode": "threaded",
+        "host": "127.0.0.1",
+        "port": 5000,
+        "workers": 8,
+        "drain_timeout": 10
+    },
+    "logging": {
+        "level": "INFO",
+        "loggers": {},
+        "max_bytes": 1024 * 1024,
+        "backup_count": 5
+    }
 }
 
 
-def load_settings() -> dict:
-    path = get_settings_path()
+def _merge(defaults: dict, data: dict) -> dict:
+    merged = {**defaults, **data}
+    for key, value in defaults.items():
+        if isinstance(value, dict):
+            override = data.get(key)
+            merged[key] = {**value, **override} if isinstance(override, dict) else value.copy()
+    return merged
+
+
+# Parsed settings, keyed by path and the file's stat, so a read costs one
+# os.stat() until the file actually changes.
+_lock = threading.Lock()
+_cache_key = None
+_cache = None
+_subscribers = ()
+REPLACE_RETRIES = 5
+
+
+def _stat_key(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return path, None
+    return path, stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def _read(path) -> dict:
     try:
         with open(path, "r", encoding="utf-8") as file:
             data = json.load(file)
         if not isinstance(data, dict):
-            return DEFAULT_SETTINGS.copy()
-        return {**DEFAULT_SETTINGS, **data}
+            return _merge(DEFAULT_SETTINGS, {})
+        return _merge(DEFAULT_SETTINGS, data)
     except Exception:
-        return DEFAULT_SETTINGS.copy()
+        return _merge(DEFAULT_SETTINGS, {})
+
+
+def _refresh():
+    # Returns (settings, previous); previous is None unless the file changed
+    # since the last read.
+    global _cache_key, _cache
+    path = get_settings_path()
+    key = _stat_key(path)
+    with _lock:
+        if key == _cache_key:
+            return _cache, None
+        previous = _cache
+        _cache = _read(path)
+        _cache_key = key
+        return _cache, previous
+
+
+def _changed_keys(previous, current):
+    return {key for key in previous.keys() | current.keys() if previous.get(key) != current.get(key)}
+
+
+def _notify(previous, current):
+    if previous is None:
+        return
+    changed = _changed_keys(previous, current)
+    if not changed:
+        return
+    for callback in _subscribers:
+        try:
+            callback(copy.deepcopy(current), changed)
+        except Exception:
+            logger.exception("Settings subscriber failed")
+
+
+def subscribe(callback):
+    # callback(settings, changed_keys) runs after every save in this process
+    # and whenever a read notices the file was changed by someone else.
+    global _subscribers
+    with _lock:
+        _subscribers = _subscribers + (callback,)
+
+    def unsubscribe():
+        global _subscribers
+        with _lock:
+            _subscribers = tuple(item for item in _subscribers if item is not callback)
+    return unsubscribe
+
+
+def load_settings() -> dict:
+    settings, previous = _refresh()
+    _notify(previous, settings)
+    return copy.deepcopy(settings)
+
+
+def check_for_changes() -> bool:
+    settings, previous = _refresh()
+    _notify(previous, settings)
+    return previous is not None
+
+
+def _write_atomic(path, data):
+    directory = os.path.dirname(path) or "."
+    fd, temp_path = tempfile.mkstemp(prefix=".settings-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False, indent=2)
+            file.flush()
+            os.fsync(file.fileno())
+        for attempt in range(REPLACE_RETRIES):
+            try:
+                os.replace(temp_path, path)
+                break
+            except PermissionError:
+                # Windows refuses while another process has the file open.
+                if attempt == REPLACE_RETRIES - 1:
+                    raise
+                time.sleep(0.05)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
 
 
 def save_settings(settings: dict) -> None:
+    global _cache_key, _cache
+    current, previous = _refresh()
+    _notify(previous, current)
     path = get_settings_path()
-    data = {**DEFAULT_SETTINGS, **(settings or {})}
-    with open(path, "w", encoding="utf-8") as file:
-        json.dump(data, file, ensure_ascii=False, indent=2)
+    with _lock:
+        # _cache rather than current: another thread may have saved since.
+        previous = _cache
+        data = _merge(previous, settings or {})
+        if data == previous and _cache_key[1] is not None:
+            # Nothing new, e.g. the server repeating a save the tray just made.
+            return
+        _write_atomic(path, data)
+        _cache = data
+        _cache_key = _stat_key(path)
+    _notify(previous, data)
+
+
+def settings_version() -> str:
+    key = _stat_key(get_settings_path())
+    if key[1] is None:
+        return "default"
+    return f"{key[1]:x}-{key[2]:x}"
+
+
+def get_storage_settings() -> dict:
+    return load_settings()["storage"]
+
+
+def get_logging_settings() -> dict:
+    return load_settings()["logging"]
+
+
+def get_server_settings() -> dict:
+    return load_settings()["server"]
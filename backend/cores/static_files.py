@@ -0,0 +1,165 @@
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger("todolist.static")
+
+# Vite writes content-hashed bundles to assets/, e.g. assets/index-BzX3k9aQ.js.
+HASHED_ASSET = re.compile(r"^assets/.+-[A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml", "application/xml")
+MIN_COMPRESS_SIZE = 512
+# Larger files stay on disk and are read per request.
+MAX_MEMORY_SIZE = 4 * 1024 * 1024
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+ENCODING_PREFERENCE = ("br", "gzip")
+
+
+def _compressible(mimetype):
+    return mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+def _is_variant(full_path):
+    # foo.js.gz next to foo.js is served as an encoding of foo.js.
+    for suffix in ENCODING_SUFFIXES.values():
+        if full_path.endswith(suffix) and os.path.isfile(full_path[:-len(suffix)]):
+            return True
+    return False
+
+
+def _compress(encoding, data):
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if encoding == "br" and brotli is not None:
+        return brotli.compress(data, quality=11)
+    return None
+
+
+def parse_accept_encoding(header):
+    accepted = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name] = quality
+    return accepted
+
+
+def choose_encoding(variants, header):
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get("*", 0.0)
+    for encoding in ENCODING_PREFERENCE:
+        if encoding in variants and accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return "identity"
+
+
+def etag_matches(header, etag):
+    if not header:
+        return False
+    tags = {tag.strip().removeprefix("W/").strip('"') for tag in header.split(",")}
+    return etag in tags or "*" in tags
+
+
+class StaticAsset:
+    __slots__ = ("path", "full_path", "mimetype", "etag", "cache_control", "variants")
+
+    def __init__(self, path, full_path, mimetype, etag, cache_control, variants):
+        self.path = path
+        self.full_path = full_path
+        self.mimetype = mimetype
+        self.etag = etag
+        self.cache_control = cache_control
+        # encoding -> bytes, or None for an identity file left on disk
+        self.variants = variants
+
+    def body(self, encoding):
+        data = self.variants[encoding]
+        if data is None:
+            with open(self.full_path, "rb") as f:
+                return f.read()
+        return data
+
+
+class StaticManifest:
+    def __init__(self, root, index="index.html"):
+        self.root = root
+        self.index = index
+        self.assets = {}
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                full_path = os.path.join(dirpath, filename)
+                path = os.path.relpath(full_path, root).replace(os.sep, "/")
+                if _is_variant(full_path):
+                    continue
+                self.assets[path] = self._load(path, full_path)
+        logger.info("Loaded %s static files from %s", len(self.assets), root)
+
+    def _load(self, path, full_path):
+        mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if mimetype.startswith("text/") or mimetype == "application/javascript":
+            mimetype += "; charset=utf-8"
+        size = os.path.getsize(full_path)
+        cache_control = IMMUTABLE if HASHED_ASSET.match(path) else REVALIDATE
+        if size > MAX_MEMORY_SIZE:
+            stat = os.stat(full_path)
+            etag = f"{stat.st_mtime_ns:x}-{size:x}"
+            return StaticAsset(path, full_path, mimetype, etag, cache_control, {"identity": None})
+        with open(full_path, "rb") as f:
+            data = f.read()
+        variants = {"identity": data}
+        if _compressible(mimetype) and size >= MIN_COMPRESS_SIZE:
+            for encoding, suffix in ENCODING_SUFFIXES.items():
+                # Use what the build already produced, else compress once here.
+                prebuilt = full_path + suffix
+                if os.path.isfile(prebuilt):
+                    with open(prebuilt, "rb") as f:
+                        compressed = f.read()
+                else:
+                    compressed = _compress(encoding, data)
+                if compressed is not None and len(compressed) < size:
+                    variants[encoding] = compressed
+        etag = hashlib.sha1(data).hexdigest()[:16]
+        return StaticAsset(path, full_path, mimetype, etag, cache_control, variants)
+
+    def lookup(self, path):
+        path = path.lstrip("/")
+        # Anything that is not a file falls back to the app shell.
+        return self.assets.get(path) or self.assets.get(self.index)
+
+    def respond(self, path, accept_encoding=None, if_none_match=None):
+        # Returns (status, headers, body) so any framework can send it.
+        asset = self.lookup(path)
+        if asset is None:
+            return 404, {}, b""
+        encoding = choose_encoding(asset.variants, accept_encoding)
+        etag = asset.etag if encoding == "identity" else f"{asset.etag}-{encoding}"
+        headers = {"ETag": f'"{etag}"', "Cache-Control": asset.cache_control}
+        if len(asset.variants) > 1:
+            headers["Vary"] = "Accept-Encoding"
+        if etag_matches(if_none_match, etag):
+            return 304, headers, b""
+        body = asset.body(encoding)
+        headers["Content-Type"] = asset.mimetype
+        headers["Content-Length"] = str(len(body))
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return 200, headers, body
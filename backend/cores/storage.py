@@ -1,119 +1,276 @@
-import sqlite3
+import time
+import sqlite3
 import logging
-from logging.handlers import RotatingFileHandler
-from dbinit import get_db_path
-from app_paths import get_logs_dir
+from contextlib import contextmanager
+from dbinit import BULK_INSERT_TRIGGERS, get_db_path, apply_connection_pragmas, has_fts
+from db_pool import ConnectionPool, WalCheckpointer
+from settings_store import get_storage_settings
+from query_plan import QueryPlanRecorder
+from batch_ops import INSERT_SQL, IMPORT_SQL, ID_STATEMENTS, parse_operations, rolled_back, consecutive_runs, chunked, task_insert_params
+from change_feed import ChangeHub
+from storage_events import StorageEvent, StorageObservers
+from task_query import (
+    TASK_COLUMNS, STREAM_CHUNK_SIZE, build_list_query, build_search_query, encode_cursor,
+    row_to_task, row_to_search_result, row_to_versioned_task
+)
+from task_import import IMPORT_CHUNK_SIZE, ImportReport, iter_import_chunks
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-
-file_handler = RotatingFileHandler(
-    f"{get_logs_dir()}/app.log", maxBytes=1024 * 1024, backupCount=5, encoding="utf-8"
-)
-file_handler.setFormatter(
-    logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-)
-logger.addHandler(file_handler)
 
 
 class SQLStorage:
-    def __init__(self, db_name="tasks"):
+    def __init__(self, db_name="tasks", pool_size=None, profile=None, explain_queries=None):
         self.db_path = get_db_path(db_name)
-        logger.debug(f"Database path resolved: {self.db_path}")
+        self.profile = profile or get_storage_settings()
+        if explain_queries is None:
+            explain_queries = bool(self.profile.get("explain_queries", False))
+        self.plan_recorder = QueryPlanRecorder() if explain_queries else None
+        self.pool = ConnectionPool(
+            self.db_path,
+            size=pool_size or self.profile.get("pool_size", 5),
+            on_connect=self._on_connect
+        )
+        self._fts_enabled = None
+        self.changes = ChangeHub()
+        self.observers = StorageObservers()
+        self.checkpointer = None
+        if str(self.profile.get("journal_mode", "")).upper() == "WAL":
+            self.checkpointer = WalCheckpointer(
+                self.pool,
+                interval=float(self.profile.get("checkpoint_interval", 60)),
+                truncate_bytes=int(self.profile.get("journal_size_limit", 0))
+            )
+            self.checkpointer.start()
+        logger.debug("Database path resolved: %s", self.db_path)
+
+    def observe(self, observer):
+        return self.observers.add(observer)
+
+    def _emit(self, op, task_id, rowcount, started):
+        if self.observers:
+            self.observers.emit(StorageEvent(op, task_id, rowcount, time.perf_counter() - started))
 
+    def _on_connect(self, conn):
+        apply_connection_pragmas(conn, self.profile)
+        if self.plan_recorder is not None:
+            self.plan_recorder.install(conn)
+
+    @contextmanager
     def _connect(self):
-        return sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+        with self.pool.connection() as conn:
+            yield conn
+            if self.plan_recorder is not None:
+                self.plan_recorder.check(conn)
+
+    @property
+    def fts_enabled(self):
+        if self._fts_enabled is None:
+            with self._connect() as conn:
+                self._fts_enabled = has_fts(conn)
+        return self._fts_enabled
+
+    def close(self):
+        if self.checkpointer is not None:
+            self.checkpointer.stop()
+        self.pool.close()
+
+    def reset_after_fork(self):
+        # The parent keeps running the checkpointer; each child only needs
+        # its own connections and its own change feed. Its seq numbers differ
+        # from its siblings', so a reconnecting client is reset, not replayed.
+        self.pool.reset_after_fork()
+        self.checkpointer = None
+        self.changes = ChangeHub(replay=False)
+
+    def _publish_insert(self, task_id, params):
+        self.changes.publish("insert", task_id, task=row_to_task((task_id,) + tuple(params)))
+
+    def _publish_update(self, task_id, description, details, due_date, category, priority, color):
+        self.changes.publish("update", task_id, changes={
+            "description": description,
+            "details": details,
+            "due_date": due_date,
+            "category": category,
+            "priority": priority,
+            "color": color
+        })
 
     def add_task(self, task):
+        started = time.perf_counter()
+        params = task_insert_params(task)
         with self._connect() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO tasks (description, details, completed, due_date, category, priority, color)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                task["description"],
-                task.get("details", ""),
-                task.get("completed", False),
-                task.get("due_date"),
-                task.get("category", "personal"),
-                task.get("priority", "medium"),
-                task.get("color")
-            ))
+            cursor.execute(INSERT_SQL, params)
             conn.commit()
             task_id = cursor.lastrowid
-            logger.debug(f"Task added: ID={task_id}")
-            return task_id
+            logger.debug("Task added: ID=%s", task_id)
+        self._publish_insert(task_id, params)
+        self._emit("add", task_id, 1, started)
+        return task_id
 
     def list_tasks(self):
+        started = time.perf_counter()
         with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM tasks")
             rows = cursor.fetchall()
-            for row in rows:
-                print(row)
-            logger.debug(f"Listed {len(rows)} tasks.")
+            logger.debug("Listed %s tasks.", len(rows))
+        self._emit("list", None, len(rows), started)
+        return rows
     
     def list_task_flasks(self):
+        tasks, _ = self.query_tasks()
+        return tasks
+
+    def query_tasks(self, sort="id", limit=None, cursor=None, **filters):
+        rows, next_cursor = self.query_task_rows(sort=sort, limit=limit, cursor=cursor, **filters)
+        return [row_to_task(row) for row in rows], next_cursor
+
+    def query_task_rows(self, sort="id", limit=None, cursor=None, **filters):
+        started = time.perf_counter()
+        sql, params = build_list_query(sort=sort, limit=limit, cursor=cursor, fts=self.fts_enabled, **filters)
         with self._connect() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM tasks")
-            rows = cursor.fetchall()
-            tasks = []
-            for row in rows:
-                task = {
-                    "id": row[0],
-                    "description": row[1],
-                    "details": row[2],
-                    "completed": bool(row[3]),
-                    "due_date": row[4],
-                    "category": row[5],
-                    "priority": row[6],
-                    "color": row[7]
-                }
-                tasks.append(task)
-            logger.debug(f"Listed {len(tasks)} tasks.")
-            return tasks
+            rows = conn.execute(sql, params).fetchall()
+        has_more = limit is not None and len(rows) > limit
+        if has_more:
+            rows = rows[:limit]
+        next_cursor = encode_cursor(sort or "id", rows[-1]) if has_more else None
+        logger.debug("Listed %s tasks.", len(rows))
+        self._emit("query", None, len(rows), started)
+        return rows, next_cursor
+
+    def iter_task_rows(self, sort="id", chunk_size=STREAM_CHUNK_SIZE, **filters):
+        # Build the query up front so bad filters fail before anything is sent.
+        sql, params = build_list_query(sort=sort, fts=self.fts_enabled, **filters)
+        return self._iter_rows(sql, params, chunk_size)
+
+    def _iter_rows(self, sql, params, chunk_size):
+        # One read transaction on a connection of its own: the whole stream
+        # is a single snapshot, and a slow reader holds no pooled connection.
+        started = time.perf_counter()
+        conn = sqlite3.connect(self.db_path, timeout=self.pool.timeout, check_same_thread=False)
+        count = 0
+        try:
+            apply_connection_pragmas(conn, self.profile)
+            conn.execute("BEGIN")
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                count += len(rows)
+                yield rows
+        finally:
+            conn.close()
+        logger.debug("Streamed %s tasks.", count)
+        self._emit("stream", None, count, started)
+
+    def search_tasks(self, q, limit=20):
+        started = time.perf_counter()
+        sql, params = build_search_query(q, limit=limit, fts=self.fts_enabled)
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        logger.debug("Search matched %s tasks.", len(rows))
+        self._emit("search", None, len(rows), started)
+        return [row_to_search_result(row) for row in rows]
+
+    def current_version(self):
+        started = time.perf_counter()
+        with self._connect() as conn:
+            row = conn.execute("SELECT version FROM change_counter WHERE id = 1").fetchone()
+        self._emit("version", None, 1 if row else 0, started)
+        return row[0] if row else 0
+
+    def changes_since(self, since, limit=None):
+        started = time.perf_counter()
+        columns = ", ".join(TASK_COLUMNS)
+        with self._connect() as conn:
+            # One read transaction so rows, tombstones and the counter come
+            # from the same snapshot.
+            conn.execute("BEGIN")
+            version = conn.execute("SELECT version FROM change_counter WHERE id = 1").fetchone()[0]
+            sql = f"SELECT {columns}, version FROM tasks WHERE version > ? ORDER BY version"
+            params = [since]
+            if limit is not None:
+                sql += " LIMIT ?"
+                params.append(limit + 1)
+            rows = conn.execute(sql, params).fetchall()
+            has_more = limit is not None and len(rows) > limit
+            if has_more:
+                rows = rows[:limit]
+                version = rows[-1][8]
+            deleted = [
+                row[0] for row in conn.execute(
+                    "SELECT id FROM task_tombstones WHERE version > ? AND version <= ? ORDER BY version",
+                    (since, version)
+                )
+            ]
+        logger.debug("Changes since %s: %s rows, %s deletions.", since, len(rows), len(deleted))
+        self._emit("changes", None, len(rows) + len(deleted), started)
+        return {
+            "version": version,
+            "tasks": [row_to_versioned_task(row) for row in rows],
+            "deleted": deleted,
+            "has_more": has_more
+        }
+
+    def count_by_status(self):
+        started = time.perf_counter()
+        with self._connect() as conn:
+            rows = conn.execute("SELECT completed, COUNT(*) FROM tasks GROUP BY completed").fetchall()
+        self._emit("count", None, len(rows), started)
+        counts = {"open": 0, "done": 0}
+        for completed, count in rows:
+            counts["done" if completed else "open"] += count
+        return counts
 
     def done_task(self, task_id):
+        started = time.perf_counter()
         with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute("UPDATE tasks SET completed = 1 WHERE id = ?", (task_id,))
             if cursor.rowcount == 0:
-                print(f"Task ID {task_id} not found.")
-                logger.warning(f"Task ID {task_id} not found to mark as done.")
+                logger.warning("Task ID %s not found to mark as done.", task_id)
+                self._emit("done", task_id, 0, started)
                 return False
             conn.commit()
-            logger.debug(f"Task marked as done: ID={task_id}")
-            print(f"Task ID {task_id} marked as done.")
+            self.changes.publish("update", task_id, changes={"completed": True})
+            logger.debug("Task marked as done: ID=%s", task_id)
+            self._emit("done", task_id, 1, started)
             return True
 
     def remove_task(self, task_id):
+        started = time.perf_counter()
         with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
             if cursor.rowcount == 0:
-                print(f"Task ID {task_id} not found.")
-                logger.warning(f"Task ID {task_id} not found for removal.")
+                logger.warning("Task ID %s not found for removal.", task_id)
+                self._emit("remove", task_id, 0, started)
                 return False
             conn.commit()
-            logger.debug(f"Task removed: ID={task_id}")
-            print(f"Task ID {task_id} removed.")
+            self.changes.publish("delete", task_id)
+            logger.debug("Task removed: ID=%s", task_id)
+            self._emit("remove", task_id, 1, started)
             return True
 
     def reopen_task(self, task_id):
+        started = time.perf_counter()
         with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute("UPDATE tasks SET completed = 0 WHERE id = ?", (task_id,))
             if cursor.rowcount == 0:
-                print(f"Task ID {task_id} not found.")
-                logger.warning(f"Task ID {task_id} not found to reopen.")
+                logger.warning("Task ID %s not found to reopen.", task_id)
+                self._emit("reopen", task_id, 0, started)
                 return False
             conn.commit()
-            logger.debug(f"Task reopened: ID={task_id}")
-            print(f"Task ID {task_id} reopened.")
+            self.changes.publish("update", task_id, changes={"completed": False})
+            logger.debug("Task reopened: ID=%s", task_id)
+            self._emit("reopen", task_id, 1, started)
             return True
 
     def update_task(self, task_id, description, details, due_date, category, priority, color):
+        started = time.perf_counter()
         with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute(
@@ -125,8 +282,143 @@ class SQLStorage:
                 (description, details, due_date, category, priority, color, task_id)
             )
             if cursor.rowcount == 0:
-                logger.warning(f"Task ID {task_id} not found to update.")
+                logger.warning("Task ID %s not found to update.", task_id)
+                self._emit("update", task_id, 0, started)
                 return False
             conn.commit()
-            logger.debug(f"Task updated: ID={task_id}")
+            self._publish_update(task_id, description, details, due_date, category, priority, color)
+            logger.debug("Task updated: ID=%s", task_id)
+            self._emit("update", task_id, 1, started)
             return True
+
+    def apply_batch(self, operations, atomic=False):
+        started = time.perf_counter()
+        items, errors = parse_operations(operations)
+        results = {error["index"]: error for error in errors}
+        if atomic and errors:
+            return rolled_back(operations, results), False
+
+        with self._connect() as conn:
+            if not conn.in_transaction:
+                conn.execute("BEGIN")
+            for op, run in consecutive_runs(items):
+                conn.execute("SAVEPOINT batch_run")
+                try:
+                    self._apply_run(conn, op, run, results)
+                except sqlite3.Error:
+                    conn.execute("ROLLBACK TO batch_run")
+                    self._apply_items(conn, op, run, results)
+                conn.execute("RELEASE batch_run")
+                if atomic and any(not results[item.index]["ok"] for item in run):
+                    conn.rollback()
+                    logger.warning("Atomic batch rolled back at op '%s'.", op)
+                    return rolled_back(operations, results), False
+        for item in items:
+            result = results[item.index]
+            if result["ok"]:
+                self._publish_batch_item(item, result)
+        applied = sum(1 for result in results.values() if result["ok"])
+        logger.debug("Batch applied: %s/%s operations.", applied, len(operations))
+        self._emit("batch", None, applied, started)
+        return [results[index] for index in sorted(results)], True
+
+    def import_tasks(self, records, strict=False, progress=None, chunk_size=IMPORT_CHUNK_SIZE):
+        report = ImportReport()
+        fts = self.fts_enabled
+        # One transaction for the whole file: either it all lands or, on a
+        # malformed file or a strict-mode failure, none of it does. The insert
+        # triggers are dropped inside it and put back before commit, so other
+        # connections never see them missing.
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for name in BULK_INSERT_TRIGGERS:
+                conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+            # Ids continue after the AUTOINCREMENT high-water mark so deleted
+            # ids are never handed out again.
+            first_id = conn.execute(
+                "SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'tasks'), 0),"
+                " COALESCE((SELECT MAX(id) FROM tasks), 0)) + 1"
+            ).fetchone()[0]
+            version = conn.execute("SELECT version FROM change_counter WHERE id = 1").fetchone()[0]
+            next_id = first_id
+            for params in iter_import_chunks(records, report, strict=strict, chunk_size=chunk_size):
+                conn.executemany(IMPORT_SQL, [
+                    (next_id + offset, version + next_id - first_id + offset + 1) + row
+                    for offset, row in enumerate(params)
+                ])
+                next_id += len(params)
+                report.imported += len(params)
+                if progress is not None:
+                    progress(report)
+            if report.imported:
+                conn.execute("UPDATE change_counter SET version = ? WHERE id = 1", (version + report.imported,))
+                if fts:
+                    conn.execute(
+                        "INSERT INTO tasks_fts (rowid, description, details)"
+                        " SELECT id, description, details FROM tasks WHERE id >= ?",
+                        (first_id,)
+                    )
+            for name, trigger_sql in BULK_INSERT_TRIGGERS.items():
+                if fts or name != "tasks_fts_insert":
+                    conn.execute(trigger_sql)
+        report.finish()
+        if report.imported:
+            # Too many rows to replay one by one; tell listeners to reload.
+            self.changes.publish("reset", None)
+        logger.info(
+            "Imported %s tasks (%s skipped) in %.2fs, %.0f rows/s.",
+            report.imported, report.skipped, report.seconds, report.rate
+        )
+        self._emit("import", None, report.imported, report.started)
+        return report
+
+    def _publish_batch_item(self, item, result):
+        if item.op == "add":
+            self._publish_insert(result["id"], item.params)
+        elif item.op == "remove":
+            self.changes.publish("delete", item.task_id)
+        elif item.op == "update":
+            self._publish_update(item.task_id, *item.params[:-1])
+        else:
+            self.changes.publish("update", item.task_id, changes={"completed": item.op == "done"})
+
+    def _apply_items(self, conn, op, run, results):
+        # The run failed as a whole; redo it one item at a time so only the
+        # items that fail are reported, each with its own error.
+        for item in run:
+            conn.execute("SAVEPOINT batch_item")
+            try:
+                self._apply_run(conn, op, [item], results)
+            except sqlite3.Error as exc:
+                conn.execute("ROLLBACK TO batch_item")
+                results[item.index] = {"index": item.index, "op": op, "ok": False, "error": str(exc)}
+            conn.execute("RELEASE batch_item")
+
+    def _apply_run(self, conn, op, run, results):
+        if op == "add":
+            cursor = conn.cursor()
+            for item in run:
+                cursor.execute(INSERT_SQL, item.params)
+                results[item.index] = {"index": item.index, "op": op, "ok": True, "id": cursor.lastrowid}
+            return
+
+        existing = set()
+        ids = sorted({item.task_id for item in run})
+        for chunk in chunked(ids):
+            placeholders = ", ".join("?" for _ in chunk)
+            rows = conn.execute(f"SELECT id FROM tasks WHERE id IN ({placeholders})", chunk).fetchall()
+            existing.update(row[0] for row in rows)
+
+        found = []
+        for item in run:
+            ok = item.task_id in existing
+            if ok and op == "remove":
+                existing.discard(item.task_id)
+            if ok:
+                found.append(item.params)
+                results[item.index] = {"index": item.index, "op": op, "ok": True, "id": item.task_id}
+            else:
+                results[item.index] = {
+                    "index": item.index, "op": op, "ok": False, "id": item.task_id, "error": "Task not found"
+                }
+        conn.executemany(ID_STATEMENTS[op], found)
@@ -0,0 +1,47 @@
+import logging
+import threading
+
+logger = logging.getLogger("storage.events")
+
+
+class StorageEvent:
+    __slots__ = ("op", "task_id", "rowcount", "duration")
+
+    def __init__(self, op, task_id, rowcount, duration):
+        self.op = op
+        self.task_id = task_id
+        self.rowcount = rowcount
+        self.duration = duration
+
+    @property
+    def ok(self):
+        return self.rowcount > 0 or self.task_id is None
+
+    def to_dict(self):
+        return {"op": self.op, "id": self.task_id, "rowcount": self.rowcount, "duration": self.duration}
+
+
+class StorageObservers:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Swapped, never mutated, so emit can read it without the lock.
+        self._observers = ()
+
+    def __bool__(self):
+        return bool(self._observers)
+
+    def add(self, observer):
+        with self._lock:
+            self._observers = self._observers + (observer,)
+        return lambda: self.remove(observer)
+
+    def remove(self, observer):
+        with self._lock:
+            self._observers = tuple(item for item in self._observers if item is not observer)
+
+    def emit(self, event):
+        for observer in self._observers:
+            try:
+                observer(event)
+            except Exception:
+                logger.exception("Storage observer failed on %s", event.op)
@@ -0,0 +1,222 @@
+import csv
+import json
+import re
+import time
+from batch_ops import check_text_fields, task_insert_params
+
+IMPORT_FORMATS = ("json", "ndjson", "csv")
+IMPORT_CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 100
+READ_SIZE = 1 << 16
+DUE_DATE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+TRUE_VALUES = ("1", "true", "yes", "y", "done")
+FALSE_VALUES = ("", "0", "false", "no", "n", "open")
+# A decode error this close to the end of the buffer may just be a literal,
+# number or escape cut off by the read; anything earlier is final.
+PARTIAL_TOKEN = 8
+FORMAT_TYPES = {
+    "application/json": "json",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "text/csv": "csv"
+}
+FORMAT_EXTENSIONS = {".json": "json", ".ndjson": "ndjson", ".jsonl": "ndjson", ".csv": "csv"}
+
+
+class ImportAborted(Exception):
+    def __init__(self, error):
+        super().__init__(f"Row {error['row']}: {error['error']}")
+        self.error = error
+
+
+def detect_format(filename=None, content_type=None, requested=None):
+    if requested:
+        if requested not in IMPORT_FORMATS:
+            raise ValueError(f"Invalid format: {requested}")
+        return requested
+    if content_type:
+        fmt = FORMAT_TYPES.get(content_type.split(";")[0].strip().lower())
+        if fmt:
+            return fmt
+    if filename:
+        for extension, fmt in FORMAT_EXTENSIONS.items():
+            if filename.lower().endswith(extension):
+                return fmt
+    raise ValueError("Cannot tell the file format, pass format=json|ndjson|csv")
+
+
+def iter_ndjson(stream):
+    for number, line in enumerate(stream, start=1):
+        if line.strip():
+            try:
+                yield number, json.loads(line)
+            except ValueError as exc:
+                yield number, ValueError(f"Invalid JSON: {exc}")
+
+
+def iter_csv(stream):
+    reader = csv.DictReader(stream)
+    for number, row in enumerate(reader, start=1):
+        yield number, row
+
+
+def may_be_cut_off(exc, size):
+    # An unterminated string reports where it started, however long it is.
+    return exc.msg.startswith("Unterminated string") or exc.pos >= size - PARTIAL_TOKEN
+
+
+def iter_json(stream):
+    # Walks a top-level array one element at a time so a large file never
+    # sits in memory whole.
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, position, eof
+        chunk = stream.read(READ_SIZE)
+        if not chunk:
+            eof = True
+        buffer = buffer[position:] + chunk
+        position = 0
+
+    def next_char():
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position < len(buffer) or eof:
+                return buffer[position] if position < len(buffer) else ""
+            fill()
+
+    first = next_char()
+    if first == "{":
+        # Only the small objects export wraps the list; read it whole.
+        while not eof:
+            fill()
+        for number, value in enumerate(json.loads(buffer).get("tasks", []), start=1):
+            yield number, value
+        return
+    if first != "[":
+        raise ValueError("Expected a JSON array")
+    position += 1
+
+    number = 0
+    while True:
+        char = next_char()
+        if char == "]":
+            return
+        if char == ",":
+            position += 1
+            char = next_char()
+        if char == "":
+            raise ValueError("Unexpected end of JSON array")
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as exc:
+                if eof or not may_be_cut_off(exc, len(buffer)):
+                    raise ValueError(f"Invalid JSON near element {number + 1}")
+                fill()
+                continue
+            if end > len(buffer) - PARTIAL_TOKEN and not eof:
+                # A number may be cut off at the buffer edge ("1." of "1.5");
+                # read on to be sure.
+                fill()
+                continue
+            break
+        position = end
+        number += 1
+        yield number, value
+
+
+def parse_completed(value):
+    if isinstance(value, bool):
+        return value
+    if value is None:
+        return False
+    if isinstance(value, int):
+        return bool(value)
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError(f"Invalid completed value: {value}")
+
+
+def validate_task(raw):
+    if isinstance(raw, Exception):
+        raise raw
+    if not isinstance(raw, dict):
+        raise ValueError("Task must be an object")
+    description = raw.get("description")
+    if not isinstance(description, str) or not description.strip():
+        raise ValueError("Description is required")
+    due_date = raw.get("due_date") or None
+    if due_date is not None and (not isinstance(due_date, str) or not DUE_DATE_PATTERN.match(due_date)):
+        raise ValueError(f"Invalid due_date: {due_date}")
+    check_text_fields(raw)
+    task = {key: value for key, value in raw.items() if value not in (None, "")}
+    task["description"] = description
+    task["due_date"] = due_date
+    task["completed"] = parse_completed(raw.get("completed"))
+    return task_insert_params(task)
+
+
+def iter_records(stream, fmt):
+    if fmt == "ndjson":
+        return iter_ndjson(stream)
+    if fmt == "csv":
+        return iter_csv(stream)
+    return iter_json(stream)
+
+
+class ImportReport:
+    def __init__(self):
+        self.imported = 0
+        self.skipped = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    def skip(self, row, error):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "error": error})
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.started
+        return self
+
+    @property
+    def rate(self):
+        elapsed = self.seconds or (time.perf_counter() - self.started)
+        return self.imported / elapsed if elapsed > 0 else 0.0
+
+    def to_dict(self):
+        return {
+            "imported": self.imported,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "seconds": round(self.seconds, 3),
+            "rows_per_second": round(self.rate)
+        }
+
+
+def iter_import_chunks(records, report, strict=False, chunk_size=IMPORT_CHUNK_SIZE):
+    chunk = []
+    for row, raw in records:
+        try:
+            chunk.append(validate_task(raw))
+        except ValueError as exc:
+            if strict:
+                raise ImportAborted({"row": row, "error": str(exc)})
+            report.skip(row, str(exc))
+            continue
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,104 @@
+import json
+from json.encoder import encode_basestring
+from task_query import TASK_COLUMNS
+
+COLUMNAR_MIME = "application/vnd.todolist.columnar+json"
+NDJSON_MIME = "application/x-ndjson"
+FORMATS = ("objects", "columnar", "ndjson")
+
+# Rows are encoded straight from the cursor tuples with the C string encoder,
+# skipping the per-row dict and the generic encoder walk of jsonify.
+OBJECT_TEMPLATE = (
+    '{"id":%s,"description":%s,"details":%s,"completed":%s,'
+    '"due_date":%s,"category":%s,"priority":%s,"color":%s}'
+)
+ROW_TEMPLATE = "[%s,%s,%s,%s,%s,%s,%s,%s]"
+COLUMNS_JSON = json.dumps(list(TASK_COLUMNS))
+
+
+def _value(value):
+    if value is None:
+        return "null"
+    if isinstance(value, str):
+        return encode_basestring(value)
+    return json.dumps(value)
+
+
+def _fields(row):
+    return (
+        _value(row[0]),
+        _value(row[1]),
+        _value(row[2]),
+        "true" if row[3] else "false",
+        _value(row[4]),
+        _value(row[5]),
+        _value(row[6]),
+        _value(row[7])
+    )
+
+
+def encode_task(row):
+    return OBJECT_TEMPLATE % _fields(row)
+
+
+def encode_row(row):
+    return ROW_TEMPLATE % _fields(row)
+
+
+def mimetype_for(fmt):
+    if fmt == "columnar":
+        return COLUMNAR_MIME
+    if fmt == "ndjson":
+        return NDJSON_MIME
+    return "application/json"
+
+
+def encode_rows(rows, fmt="objects"):
+    encode = encode_row if fmt == "columnar" else encode_task
+    return "[" + ",".join([encode(row) for row in rows]) + "]"
+
+
+def encode_task_list(rows, fmt="objects", **extra):
+    parts = []
+    if fmt == "columnar":
+        parts.append(f'"columns":{COLUMNS_JSON}')
+        parts.append(f'"rows":{encode_rows(rows, fmt)}')
+    else:
+        parts.append(f'"tasks":{encode_rows(rows, fmt)}')
+    for key, value in extra.items():
+        parts.append(f"{encode_basestring(key)}:{json.dumps(value, ensure_ascii=False)}")
+    return "{" + ",".join(parts) + "}"
+
+
+def stream_task_list(chunks, fmt="objects", **extra):
+    encode = encode_row if fmt == "columnar" else encode_task
+    if fmt == "columnar":
+        yield f'{{"columns":{COLUMNS_JSON},"rows":['
+    else:
+        yield '{"tasks":['
+    separator = ""
+    for rows in chunks:
+        yield separator + ",".join([encode(row) for row in rows])
+        separator = ","
+    yield "]"
+    for key, value in extra.items():
+        yield f",{encode_basestring(key)}:{json.dumps(value, ensure_ascii=False)}"
+    yield "}"
+
+
+def stream_ndjson(chunks):
+    for rows in chunks:
+        yield "".join([encode_task(row) + "\n" for row in rows])
+
+
+def choose_format(args, accept):
+    fmt = args.get("format")
+    if fmt:
+        if fmt not in FORMATS:
+            raise ValueError(f"Invalid format: {fmt}")
+        return fmt
+    if accept and COLUMNAR_MIME in accept:
+        return "columnar"
+    if accept and NDJSON_MIME in accept:
+        return "ndjson"
+    return "objects"
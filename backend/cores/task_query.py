@@ -0,0 +1,198 @@
+import base64
+import json
+
+TASK_COLUMNS = ("id", "description", "details", "completed", "due_date", "category", "priority", "color")
+STATUS_FILTERS = ("all", "open", "done")
+SORT_OPTIONS = ("id", "-id", "due_date", "-due_date")
+MAX_LIMIT = 1000
+# The trigram tokenizer cannot match anything shorter than three characters.
+FTS_MIN_TERM = 3
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+STREAM_CHUNK_SIZE = 500
+
+
+def row_to_task(row):
+    return {
+        "id": row[0],
+        "description": row[1],
+        "details": row[2],
+        "completed": bool(row[3]),
+        "due_date": row[4],
+        "category": row[5],
+        "priority": row[6],
+        "color": row[7]
+    }
+
+
+def row_to_versioned_task(row):
+    task = row_to_task(row)
+    task["version"] = row[8]
+    return task
+
+
+def encode_cursor(sort, row):
+    value = row[TASK_COLUMNS.index(sort.lstrip("-"))]
+    payload = json.dumps([value, row[0]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, task_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(task_id, int) or (value is not None and not isinstance(value, (str, int))):
+        raise ValueError("Invalid cursor")
+    return value, task_id
+
+
+def _keyset_clause(sort, cursor):
+    value, task_id = decode_cursor(cursor)
+    if sort == "id":
+        return "id > ?", [task_id]
+    if sort == "-id":
+        return "id < ?", [task_id]
+    # SQLite sorts NULL due dates first ascending and last descending.
+    if sort == "due_date":
+        if value is None:
+            return "((due_date IS NULL AND id > ?) OR due_date IS NOT NULL)", [task_id]
+        return "(due_date > ? OR (due_date = ? AND id > ?))", [value, value, task_id]
+    if value is None:
+        return "(due_date IS NULL AND id < ?)", [task_id]
+    return "(due_date < ? OR (due_date = ? AND id < ?) OR due_date IS NULL)", [value, value, task_id]
+
+
+def _escape_like(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def fts_match_expression(terms):
+    quoted = ['"' + term.replace('"', '""') + '"' for term in terms if len(term) >= FTS_MIN_TERM]
+    return " AND ".join(quoted) or None
+
+
+def _like_clauses(terms, column_prefix=""):
+    clauses = []
+    params = []
+    for term in terms:
+        pattern = f"%{_escape_like(term)}%"
+        clauses.append(
+            f"({column_prefix}description LIKE ? ESCAPE '\\' OR {column_prefix}details LIKE ? ESCAPE '\\')"
+        )
+        params.extend([pattern, pattern])
+    return clauses, params
+
+
+def _search_clauses(q, fts):
+    terms = q.split()
+    match = fts_match_expression(terms) if fts else None
+    if match is None:
+        return _like_clauses(terms)
+    clauses = ["id IN (SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH ?)"]
+    params = [match]
+    short_clauses, short_params = _like_clauses([term for term in terms if len(term) < FTS_MIN_TERM])
+    return clauses + short_clauses, params + short_params
+
+
+def build_where(status=None, category=None, priority=None, q=None, due_before=None, due_after=None, fts=False):
+    clauses = []
+    params = []
+    status = status or "all"
+    if status not in STATUS_FILTERS:
+        raise ValueError(f"Invalid status: {status}")
+    if status != "all":
+        clauses.append("completed = ?")
+        params.append(1 if status == "done" else 0)
+    if category and category != "all":
+        clauses.append("category = ?")
+        params.append(category)
+    if priority and priority != "all":
+        clauses.append("priority = ?")
+        params.append(priority)
+    # Without likelihood() the planner guesses a one-sided range matches a
+    # quarter of the table and walks it in id order instead of using
+    # idx_tasks_due_date.
+    if due_after:
+        clauses.append("likelihood(due_date > ?, 0.05)")
+        params.append(due_after)
+    if due_before:
+        clauses.append("likelihood(due_date < ?, 0.05)")
+        params.append(due_before)
+    if q:
+        search_clauses, search_params = _search_clauses(q, fts)
+        clauses.extend(search_clauses)
+        params.extend(search_params)
+    return clauses, params
+
+
+def build_list_query(sort="id", limit=None, cursor=None, **filters):
+    sort = sort or "id"
+    if sort not in SORT_OPTIONS:
+        raise ValueError(f"Invalid sort: {sort}")
+    clauses, params = build_where(**filters)
+    if cursor:
+        clause, cursor_params = _keyset_clause(sort, cursor)
+        clauses.append(clause)
+        params.extend(cursor_params)
+
+    sql = f"SELECT {', '.join(TASK_COLUMNS)} FROM tasks"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    direction = "DESC" if sort.startswith("-") else "ASC"
+    if sort.lstrip("-") == "due_date":
+        sql += f" ORDER BY due_date {direction}, id {direction}"
+    else:
+        sql += f" ORDER BY id {direction}"
+    if limit is not None:
+        # Fetch one extra row to know whether another page exists.
+        sql += " LIMIT ?"
+        params.append(limit + 1)
+    return sql, params
+
+
+def build_search_query(q, limit=SEARCH_DEFAULT_LIMIT, fts=True, mark=("<mark>", "</mark>")):
+    terms = q.split()
+    match = fts_match_expression(terms) if fts else None
+    columns = ", ".join(f"tasks.{column}" for column in TASK_COLUMNS)
+    if match is None:
+        clauses, params = _like_clauses(terms, column_prefix="tasks.")
+        sql = (
+            f"SELECT {columns}, tasks.description, tasks.details, 0 FROM tasks"
+            f" WHERE {' AND '.join(clauses)} ORDER BY tasks.id DESC LIMIT ?"
+        )
+        return sql, params + [limit]
+
+    short_clauses, short_params = _like_clauses(
+        [term for term in terms if len(term) < FTS_MIN_TERM], column_prefix="tasks."
+    )
+    start, end = mark
+    sql = (
+        f"SELECT {columns},"
+        " snippet(tasks_fts, 0, ?, ?, '…', 12),"
+        " snippet(tasks_fts, 1, ?, ?, '…', 24),"
+        " bm25(tasks_fts, 4.0, 1.0) AS rank"
+        " FROM tasks_fts JOIN tasks ON tasks.id = tasks_fts.rowid"
+        " WHERE tasks_fts MATCH ?"
+    )
+    for clause in short_clauses:
+        sql += f" AND {clause}"
+    sql += " ORDER BY rank LIMIT ?"
+    return sql, [start, end, start, end, match] + short_params + [limit]
+
+
+def row_to_search_result(row):
+    result = row_to_task(row)
+    result["snippet"] = {"description": row[8], "details": row[9]}
+    result["rank"] = row[10]
+    return result
+
+
+def parse_limit(value, default=None, maximum=MAX_LIMIT):
+    if value in (None, ""):
+        return default
+    limit = int(value)
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return min(limit, maximum)
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import threading
+import pytest
+import asgi_app
+import server
+from change_feed import ChangeHub
+
+
+async def call(method, path, query="", body=b"", headers=(), chunks=None):
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": query.encode("latin-1"),
+        "headers": [(key.lower().encode("latin-1"), value.encode("latin-1")) for key, value in headers]
+    }
+    messages = [{"type": "http.request", "body": chunk, "more_body": True} for chunk in chunks or ()]
+    messages.append({"type": "http.request", "body": body, "more_body": False})
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.Event().wait()
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi_app.app(scope, receive, send)
+    start = sent[0]
+    return start["status"], dict(start["headers"]), b"".join(message.get("body", b"") for message in sent[1:])
+
+
+def request(method, path, query="", json_body=None, headers=()):
+    body = b""
+    if json_body is not None:
+        body = json.dumps(json_body).encode("utf-8")
+        headers = tuple(headers) + (("Content-Type", "application/json"),)
+    return asyncio.run(call(method, path, query, body, headers))
+
+
+@pytest.fixture(autouse=True)
+def empty_tasks():
+    with server.storage.pool.connection() as conn:
+        conn.execute("DELETE FROM tasks")
+
+
+def add(description, **task):
+    status, _, body = request("POST", "/api/add", json_body={"description": description, **task})
+    assert status == 200
+    return json.loads(body)["task_id"]
+
+
+def test_list_matches_flask():
+    for i in range(3):
+        add(f"task {i}", category="work")
+    flask_data = server.app.test_client().get("/api/list?limit=2&category=work").get_json()
+    status, headers, body = request("GET", "/api/list", "limit=2&category=work")
+    assert status == 200
+    assert json.loads(body) == flask_data
+    etag = headers[b"etag"].decode()
+    status, _, body = request("GET", "/api/list", "limit=2&category=work", headers=[("If-None-Match", etag)])
+    assert (status, body) == (304, b"")
+
+
+def test_list_streams_ndjson():
+    ids = [add(f"task {i}") for i in range(3)]
+    status, headers, body = request("GET", "/api/list", headers=[("Accept", "application/x-ndjson")])
+    assert status == 200
+    assert headers[b"content-type"] == b"application/x-ndjson"
+    assert [json.loads(line)["id"] for line in body.decode().splitlines()] == ids
+
+
+def test_mutations_and_errors():
+    task_id = add("write tests")
+    assert request("POST", "/api/done", json_body={"id": task_id})[0] == 200
+    assert request("POST", "/api/done", f"id={task_id + 100}")[0] == 404
+    assert request("POST", "/api/remove", json_body={})[0] == 400
+    assert request("GET", "/api/list", "limit=abc")[0] == 400
+    assert request("GET", "/api/add")[0] == 405
+    assert request("GET", "/api/nope")[0] == 404
+    status, _, body = request("POST", "/api/batch", json_body={"operations": [{"op": "remove", "id": task_id}]})
+    assert status == 200
+    assert json.loads(body)["applied"] is True
+
+
+def test_import_raw_body():
+    body = b'{"description": "one"}\n{"description": "two"}\n'
+    status, _, data = asyncio.run(call(
+        "POST", "/api/import", "format=ndjson", body, [("Content-Type", "application/x-ndjson")]
+    ))
+    assert status == 200
+    assert json.loads(data)["imported"] == 2
+
+
+def test_import_reads_the_body_as_it_arrives():
+    lines = [f'{{"description": "row {i}"}}\n'.encode() for i in range(200)]
+    status, _, data = asyncio.run(call(
+        "POST", "/api/import", "format=ndjson", b"", [("Content-Type", "application/x-ndjson")], chunks=lines
+    ))
+    assert status == 200
+    assert json.loads(data)["imported"] == 200
+
+
+def test_change_feed_subscribes_when_created():
+    hub = ChangeHub()
+    feed = asgi_app.AsyncChangeFeed(hub)
+    try:
+        assert hub.subscriber_count == 1
+    finally:
+        feed.close()
+        hub.close()
+
+
+def test_events_stream_without_a_thread_per_client():
+    async def scenario():
+        sent = []
+        disconnect = asyncio.Event()
+        got_change = asyncio.Event()
+        threads = threading.active_count()
+
+        async def receive():
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+            if sum(b"event: change" in item.get("body", b"") for item in sent) == 20:
+                got_change.set()
+
+        scope = {"type": "http", "method": "GET", "path": "/api/events", "query_string": b"", "headers": []}
+        streams = [asyncio.ensure_future(asgi_app.app(scope, receive, send)) for _ in range(20)]
+        await asyncio.sleep(0.05)
+        # One pump thread for the feed, however many clients are connected.
+        assert threading.active_count() <= threads + 1
+        await asyncio.get_running_loop().run_in_executor(None, server.storage.add_task, {"description": "pushed"})
+        await asyncio.wait_for(got_change.wait(), 5)
+        disconnect.set()
+        await asyncio.wait_for(asyncio.gather(*streams), 5)
+        return sent
+
+    sent = asyncio.run(scenario())
+    changes = [message for message in sent if b"event: change" in message.get("body", b"")]
+    assert len(changes) == 20
+    assert sent[-1] == {"type": "http.response.body", "body": b""}
@@ -0,0 +1,44 @@
+import bench
+
+
+def test_storage_benchmark_reports_every_operation():
+    results = bench.bench_storage([50], ops=10)
+    names = [result["name"] for result in results]
+    assert names == [
+        "storage.populate", "storage.add", "storage.list_page", "storage.search",
+        "storage.update", "storage.done", "storage.remove"
+    ]
+    assert all(result["size"] == 50 and result["ops_per_sec"] > 0 for result in results)
+    assert results[1]["ops"] == 10 and results[1]["p50_ms"] <= results[1]["p99_ms"]
+
+
+def test_compare_flags_regressions():
+    baseline = {"results": [
+        {"name": "storage.add", "size": 1000, "ops_per_sec": 1000.0},
+        {"name": "storage.done", "size": 1000, "ops_per_sec": 1000.0}
+    ]}
+    current = {"results": [
+        {"name": "storage.add", "size": 1000, "ops_per_sec": 950.0},
+        {"name": "storage.done", "size": 1000, "ops_per_sec": 700.0},
+        {"name": "storage.remove", "size": 1000, "ops_per_sec": 10.0}
+    ]}
+    rows = bench.compare(baseline, current, threshold=0.15)
+    assert [(row["key"][0], row["regressed"]) for row in rows] == [("storage.add", False), ("storage.done", True)]
+
+
+def test_asgi_benchmark_compares_both_apps():
+    results = bench.bench_asgi([1, 4], requests=8, size=20)
+    assert [result["name"] for result in results[:4]] == [
+        "wsgi.list_page", "asgi.list_page", "wsgi.health", "asgi.health"
+    ]
+    assert all(result["ops"] == 8 and result["ops_per_sec"] > 0 for result in results)
+
+
+def test_parse_importtime():
+    text = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |   _io\n"
+        "import time:      2500 |       9000 | server\n"
+    )
+    assert bench.parse_importtime(text) == [(120, 120, "_io"), (2500, 9000, "server")]
+    assert bench.startup_code("server:create_app") == "import server; server.create_app()"
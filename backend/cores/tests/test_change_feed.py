@@ -0,0 +1,27 @@
+from change_feed import ChangeHub, format_sse
+
+
+def test_publish_assigns_increasing_sequence_numbers():
+    hub = ChangeHub()
+    subscription = hub.subscribe()
+    first = hub.publish("insert", 1, task={"id": 1})
+    second = hub.publish("delete", 1)
+    assert (first["seq"], second["seq"]) == (1, 2)
+    assert subscription.get(timeout=1) == first
+    assert subscription.get(timeout=1) == second
+    subscription.close()
+    assert hub.subscriber_count == 0
+
+
+def test_events_since_resumes_or_asks_for_resync():
+    hub = ChangeHub(backlog=3)
+    for task_id in range(5):
+        hub.publish("delete", task_id)
+    assert [event["seq"] for event in hub.events_since(3)] == [4, 5]
+    assert hub.events_since(5) == []
+    assert hub.events_since(0) is None
+    assert hub.events_since(99) is None
+
+
+def test_format_sse_uses_sequence_as_event_id():
+    assert format_sse({"seq": 7, "op": "delete", "id": 3}).startswith("id: 7\nevent: change\ndata: ")
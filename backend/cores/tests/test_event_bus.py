@@ -0,0 +1,53 @@
+import queue
+import time
+import event_bus
+import server
+import settings_store
+from event_bus import EventBus, TASKS, SETTINGS, iter_sse
+
+
+def test_subscribe_publish_and_unsubscribe():
+    bus = EventBus()
+    seen = []
+    unsubscribe = bus.subscribe(TASKS, seen.append)
+    bus.subscribe(TASKS, lambda event: 1 / 0)
+    bus.publish(TASKS, {"op": "insert"})
+    bus.publish(SETTINGS, {"changed": {"language"}})
+    unsubscribe()
+    bus.publish(TASKS, {"op": "delete"})
+    assert seen == [{"op": "insert"}]
+
+
+def test_iter_sse():
+    lines = [b"retry: 3000\n", b"\n", b"id: 4\n", b"event: change\n", b'data: {"seq": 4}\n', b"\n",
+             b": keepalive\n", b"\n", b"event: settings\r\n", b'data: {"seq": 5}\r\n', b"\r\n"]
+    assert list(iter_sse(lines)) == [("change", '{"seq": 4}'), ("settings", '{"seq": 5}')]
+
+
+def test_storage_and_settings_changes_reach_the_bus(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings_store, "get_settings_path", lambda: str(tmp_path / "settings.json"))
+    events = queue.Queue()
+    unsubscribe_tasks = event_bus.bus.subscribe(TASKS, events.put)
+    unsubscribe_settings = event_bus.bus.subscribe(SETTINGS, events.put)
+    subscribers = server.storage.changes.subscriber_count
+    subscription = server.storage.changes.subscribe()
+    try:
+        event_bus.connect_settings()
+        event_bus.connect_storage(server.storage)
+        while server.storage.changes.subscriber_count < subscribers + 2:
+            time.sleep(0.01)
+        task_id = server.storage.add_task({"description": "badge me"})
+        event = events.get(timeout=5)
+        assert (event["op"], event["id"]) == ("insert", task_id)
+
+        settings_store.save_settings({"language": "zh"})
+        event = events.get(timeout=5)
+        assert event["changed"] == {"language"}
+        # Remote trays hear about it through the change feed.
+        feed = [subscription.get(timeout=5) for _ in range(2)]
+        assert feed[1]["op"] == "settings" and server.event_name(feed[1]) == "settings"
+        assert events.empty()
+    finally:
+        subscription.close()
+        unsubscribe_tasks()
+        unsubscribe_settings()
@@ -0,0 +1,38 @@
+import logging
+import os
+import log_setup
+from app_paths import get_logs_dir
+
+
+def read_log(name):
+    path = os.path.join(get_logs_dir(), name)
+    if not os.path.exists(path):
+        return ""
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def test_records_go_through_the_listener_to_their_file():
+    log_setup.shutdown_logging()
+    settings = {"level": "info", "loggers": {"storage.plan": "debug"}, "max_bytes": 1024 * 1024, "backup_count": 1}
+    log_setup.setup_logging(settings)
+    try:
+        assert log_setup.setup_logging() is log_setup._listener
+        logging.getLogger("storage").debug("filtered storage message")
+        logging.getLogger("storage.plan").debug("plan debug message")
+        logging.getLogger("todolist.server").info("server info message")
+    finally:
+        log_setup.shutdown_logging()
+
+    app_log = read_log("app.log")
+    backend_log = read_log("backend.log")
+    assert "plan debug message" in app_log
+    assert "filtered storage message" not in app_log
+    assert "server info message" in backend_log
+    assert "server info message" not in app_log
+
+
+def test_unknown_level_falls_back():
+    log_setup.apply_levels({"level": "loud", "loggers": {"dbinit": "nope"}})
+    assert logging.getLogger("storage").level == logging.INFO
+    assert logging.getLogger("dbinit").level == logging.INFO
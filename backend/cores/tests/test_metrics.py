@@ -0,0 +1,28 @@
+from metrics import MetricsRegistry
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    latency = registry.histogram("op_seconds", "Latency.", ("op",), buckets=(0.1, 1.0))
+    latency.observe(0.05, "add")
+    latency.observe(0.1, "add")
+    latency.observe(3, "add")
+    text = registry.render()
+    assert '# TYPE op_seconds histogram' in text
+    assert 'op_seconds_bucket{op="add",le="0.1"} 2' in text
+    assert 'op_seconds_bucket{op="add",le="1"} 2' in text
+    assert 'op_seconds_bucket{op="add",le="+Inf"} 3' in text
+    assert 'op_seconds_count{op="add"} 3' in text
+
+
+def test_counter_and_callback_metrics():
+    registry = MetricsRegistry()
+    rows = registry.counter("rows_total", "Rows.", ("op",))
+    rows.inc("list", amount=5)
+    rows.inc("list")
+    registry.gauge_callback("pool_size", "Size.", lambda: 4)
+    registry.gauge_callback("conns", "Conns.", lambda: {("idle",): 1, ("in_use",): 2}, ("state",))
+    text = registry.render()
+    assert 'rows_total{op="list"} 6' in text
+    assert "pool_size 4" in text
+    assert 'conns{state="in_use"} 2' in text
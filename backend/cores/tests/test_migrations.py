@@ -0,0 +1,66 @@
+import sqlite3
+import pytest
+import dbinit
+from migrations import Migration, migrate, schema_version
+
+
+def test_up_to_date_database_reads_one_pragma(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "tasks.db"))
+    assert migrate(conn, dbinit.MIGRATIONS) == [1, 2, 3, 4, 5]
+    assert schema_version(conn) == 5
+    statements = []
+    conn.set_trace_callback(statements.append)
+    assert migrate(conn, dbinit.MIGRATIONS) == []
+    assert statements == ["PRAGMA user_version"]
+    conn.close()
+
+
+def test_failed_step_rolls_back_and_is_retried(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "steps.db"))
+    calls = []
+
+    def create(cursor):
+        cursor.execute("CREATE TABLE notes (id INTEGER PRIMARY KEY)")
+
+    def broken(cursor):
+        calls.append("broken")
+        cursor.execute("ALTER TABLE notes ADD COLUMN body TEXT")
+        raise RuntimeError("boom")
+
+    def fixed(cursor):
+        calls.append("fixed")
+        cursor.execute("ALTER TABLE notes ADD COLUMN body TEXT")
+
+    with pytest.raises(RuntimeError):
+        migrate(conn, [Migration(1, "notes", create), Migration(2, "body", broken)])
+    assert schema_version(conn) == 1
+    assert [row[1] for row in conn.execute("PRAGMA table_info(notes)")] == ["id"]
+
+    assert migrate(conn, [Migration(1, "notes", create), Migration(2, "body", fixed)]) == [2]
+    assert calls == ["broken", "fixed"]
+    assert schema_version(conn) == 2
+    conn.close()
+
+
+def test_migrations_must_be_numbered_in_order(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "bad.db"))
+    with pytest.raises(ValueError):
+        migrate(conn, [Migration(2, "skip", lambda cursor: None)])
+    conn.close()
+
+
+def test_missing_search_index_is_created_on_a_later_start(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "nofts.db"))
+    migrate(conn, dbinit.MIGRATIONS)
+    # What a start on an SQLite without FTS5 or trigram leaves behind.
+    for trigger in dbinit.FTS_TRIGGERS:
+        conn.execute(f"DROP TRIGGER {trigger.split('EXISTS')[1].split()[0]}")
+    conn.execute("DROP TABLE tasks_fts")
+    conn.execute("INSERT INTO tasks (description) VALUES ('weekly report')")
+    conn.commit()
+    assert schema_version(conn) == 5 and not dbinit.has_fts(conn)
+
+    assert dbinit.repair_fts(conn)
+    assert conn.execute("SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH 'report'").fetchall() == [(1,)]
+    assert not dbinit.repair_fts(conn)
+    conn.close()
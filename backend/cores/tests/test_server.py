@@ -0,0 +1,212 @@
+import io
+import os
+import subprocess
+import sys
+import json
+import pytest
+import server
+from task_json import COLUMNAR_MIME
+from task_query import TASK_COLUMNS
+
+
+@pytest.fixture
+def client():
+    with server.storage.pool.connection() as conn:
+        conn.execute("DELETE FROM tasks")
+    server.app.config["TESTING"] = True
+    with server.app.test_client() as client:
+        yield client
+
+
+def add(client, **task):
+    return client.post("/api/add", json=task).get_json()["task_id"]
+
+
+def test_list_without_params_returns_everything(client):
+    ids = [add(client, description=f"task {i}") for i in range(3)]
+    data = client.get("/api/list").get_json()
+    assert [task["id"] for task in data["tasks"]] == ids
+    assert data["next_cursor"] is None
+    assert data["counts"] == {"open": 3, "done": 0}
+
+
+def test_list_pages_with_cursor(client):
+    ids = [add(client, description=f"task {i}", category="work") for i in range(5)]
+    first = client.get("/api/list?limit=2&category=work").get_json()
+    assert [task["id"] for task in first["tasks"]] == ids[:2]
+    second = client.get(f"/api/list?limit=2&category=work&cursor={first['next_cursor']}").get_json()
+    assert [task["id"] for task in second["tasks"]] == ids[2:4]
+
+
+def test_list_columnar_format(client):
+    ids = [add(client, description=f"task {i}", details="naïve \"quoted\"") for i in range(2)]
+    objects = client.get("/api/list").get_json()
+    response = client.get("/api/list", headers={"Accept": COLUMNAR_MIME})
+    assert response.mimetype == COLUMNAR_MIME
+    assert "Accept" in response.headers["Vary"]
+    data = response.get_json(force=True)
+    assert data["columns"] == list(TASK_COLUMNS)
+    assert [row[0] for row in data["rows"]] == ids
+    assert [dict(zip(data["columns"], row)) for row in data["rows"]] == objects["tasks"]
+    assert client.get("/api/list?format=columnar").get_json(force=True)["rows"] == data["rows"]
+
+
+def test_list_streams_ndjson_and_json(client):
+    ids = [add(client, description=f"task {i}") for i in range(3)]
+    plain = client.get("/api/list").get_json()
+
+    response = client.get("/api/list", headers={"Accept": "application/x-ndjson"})
+    assert response.mimetype == "application/x-ndjson"
+    lines = response.get_data(as_text=True).splitlines()
+    assert [json.loads(line) for line in lines] == plain["tasks"]
+
+    streamed = client.get("/api/list?stream=1").get_json()
+    assert streamed["tasks"] == plain["tasks"]
+    assert streamed["counts"] == plain["counts"]
+    assert [task["id"] for task in streamed["tasks"]] == ids
+    assert client.get("/api/list?stream=1&limit=2").status_code == 400
+
+
+def test_export_endpoint(client):
+    ids = [add(client, description=f"task {i}") for i in range(3)]
+    response = client.get("/api/export")
+    assert "attachment" in response.headers["Content-Disposition"]
+    assert [json.loads(line)["id"] for line in response.get_data(as_text=True).splitlines()] == ids
+    data = client.get("/api/export?format=objects").get_json()
+    assert [task["id"] for task in data["tasks"]] == ids
+    assert client.get("/api/export?format=csv").status_code == 400
+
+
+def test_import_endpoint(client):
+    body = "description,details,completed\nfirst,a,false\nsecond,b,true\n,missing,false\n"
+    response = client.post("/api/import", data=body, content_type="text/csv")
+    data = response.get_json()
+    assert (data["imported"], data["skipped"]) == (2, 1)
+    tasks = client.get("/api/list").get_json()["tasks"]
+    assert [(task["description"], task["completed"]) for task in tasks] == [("first", False), ("second", True)]
+
+    upload = {"file": (io.BytesIO(b'[{"description": "from file"}]'), "tasks.json")}
+    assert client.post("/api/import", data=upload).get_json()["imported"] == 1
+    assert client.post("/api/import", data="[{", content_type="application/json").status_code == 400
+    assert client.post("/api/import", data="x", content_type="text/plain").status_code == 400
+
+
+def test_list_rejects_invalid_params(client):
+    assert client.get("/api/list?format=xml").status_code == 400
+    assert client.get("/api/list?sort=color").status_code == 400
+    assert client.get("/api/list?limit=0").status_code == 400
+    assert client.get("/api/list?limit=abc").status_code == 400
+
+
+def test_search_endpoint(client):
+    task_id = add(client, description="Prepare weekly report")
+    add(client, description="Something else")
+    data = client.get("/api/search?q=weekly&limit=5").get_json()
+    assert [result["id"] for result in data["results"]] == [task_id]
+    assert client.get("/api/search").status_code == 400
+    assert client.get("/api/search?q=x&limit=-1").status_code == 400
+
+
+def test_batch_endpoint(client):
+    ids = [add(client, description=f"task {i}") for i in range(3)]
+    response = client.post("/api/batch", json={"operations": [{"op": "done", "id": i} for i in ids]})
+    assert response.status_code == 200
+    assert all(result["ok"] for result in response.get_json()["results"])
+    assert client.get("/api/list").get_json()["counts"] == {"open": 0, "done": 3}
+
+    response = client.post("/api/batch", json={"atomic": True, "operations": [{"op": "remove", "id": ids[0]}, {"op": "remove", "id": -1}]})
+    assert response.status_code == 409
+    assert len(client.get("/api/list").get_json()["tasks"]) == 3
+    assert client.post("/api/batch", json={"operations": "nope"}).status_code == 400
+    assert client.post("/api/batch", json=[1, 2]).status_code == 400
+    response = client.post("/api/batch", json={"atomic": True, "operations": [{"op": "done", "id": ids[0]}, {"op": "bogus"}]})
+    assert [result["error"] for result in response.get_json()["results"]] == ["Rolled back", "Unknown op: bogus"]
+
+
+def test_events_stream_replays_from_last_event_id(client):
+    start = server.storage.changes.seq
+    task_id = add(client, description="streamed")
+    client.post("/api/done", json={"id": task_id})
+
+    response = client.get("/api/events", headers={"Last-Event-ID": str(start)}, buffered=False)
+    assert response.mimetype == "text/event-stream"
+    chunks = response.iter_encoded()
+    assert next(chunks) == b"retry: 3000\n\n"
+    insert = next(chunks).decode("utf-8")
+    update = next(chunks).decode("utf-8")
+    response.close()
+    assert insert.startswith(f"id: {start + 1}\n") and '"op": "insert"' in insert
+    assert update.startswith(f"id: {start + 2}\n") and '"completed": true' in update
+
+
+def test_changes_endpoint(client):
+    since = client.get("/api/changes?since=0").get_json()["version"]
+    task_id = add(client, description="sync me")
+    client.post("/api/remove", json={"id": task_id})
+    data = client.get(f"/api/changes?since={since}").get_json()
+    assert data["tasks"] == []
+    assert data["deleted"] == [task_id]
+    assert client.get("/api/changes?since=abc").status_code == 400
+
+
+def test_list_etag_revalidates_until_a_write(client):
+    add(client, description="cached")
+    first = client.get("/api/list?limit=10")
+    etag = first.headers["ETag"]
+    again = client.get("/api/list?limit=10", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.data == b""
+    assert client.get("/api/list?limit=5", headers={"If-None-Match": etag}).status_code == 200
+
+    add(client, description="invalidates")
+    assert client.get("/api/list?limit=10", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_settings_etag(client):
+    etag = client.get("/api/settings").headers["ETag"]
+    assert client.get("/api/settings", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_metrics_endpoint(client):
+    task_id = add(client, description="measured")
+    client.post("/api/done", json={"id": task_id})
+    client.get("/api/list")
+    response = client.get("/api/metrics")
+    assert response.mimetype == "text/plain"
+    text = response.get_data(as_text=True)
+    assert 'todolist_http_request_duration_seconds_count{method="GET",route="/api/list",status="200"}' in text
+    assert 'todolist_storage_operation_duration_seconds_count{op="done"}' in text
+    assert 'todolist_pool_connections{state="open"}' in text
+    assert "todolist_pool_acquire_total" in text
+
+
+def test_health_reports_db_and_pool(client):
+    data = client.get("/api/health").get_json()
+    assert data["status"] == "ok"
+    assert data["db"]["version"] == server.storage.current_version()
+    assert data["pool"]["size"] == server.storage.pool.size
+
+
+def test_importing_server_does_no_startup_work(tmp_path):
+    code = "import os, server; print(sorted(os.listdir(os.environ['APPDATA'])))"
+    env = {**os.environ, "APPDATA": str(tmp_path)}
+    out = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(server.__file__), env=env,
+                         capture_output=True, text=True, check=True).stdout
+    assert out.strip() == "[]"
+
+
+def test_create_app_reuses_and_closes_its_storage(tmp_path):
+    code = (
+        "import server, settings_store\n"
+        "app = server.create_app(); storage = server.storage\n"
+        "subscribers = len(settings_store._subscribers)\n"
+        "assert server.create_app() is app and len(settings_store._subscribers) == subscribers\n"
+        "server.close_app()\n"
+        "assert len(settings_store._subscribers) == subscribers - 1\n"
+        "assert server.storage is not storage and len(settings_store._subscribers) == subscribers\n"
+        "print('ok')"
+    )
+    env = {**os.environ, "APPDATA": str(tmp_path)}
+    out = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(server.__file__), env=env,
+                         capture_output=True, text=True, check=True).stdout
+    assert out.strip() == "ok"
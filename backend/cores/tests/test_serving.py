@@ -0,0 +1,80 @@
+import os
+import threading
+import time
+import urllib.request
+import pytest
+from serving import AppServer
+
+
+def slow_app(environ, start_response):
+    if environ["PATH_INFO"] == "/slow":
+        time.sleep(0.5)
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [f"{os.getpid()}".encode("ascii")]
+
+
+def fetch(url, timeout=5):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.read().decode("ascii")
+
+
+@pytest.mark.parametrize("mode", ["threaded", "pool"])
+def test_slow_request_does_not_block_others(mode):
+    server = AppServer(slow_app, port=0, mode=mode, workers=4).start()
+    try:
+        slow = threading.Thread(target=fetch, args=(server.url + "/slow",))
+        slow.start()
+        time.sleep(0.05)
+        started = time.perf_counter()
+        fetch(server.url + "/fast")
+        assert time.perf_counter() - started < 0.4
+        slow.join()
+    finally:
+        server.stop()
+
+
+def test_stop_drains_in_flight_requests():
+    server = AppServer(slow_app, port=0, mode="pool", workers=2, drain_timeout=5).start()
+    results = []
+    slow = threading.Thread(target=lambda: results.append(fetch(server.url + "/slow")))
+    slow.start()
+    time.sleep(0.1)
+    server.stop()
+    slow.join()
+    assert results == [str(os.getpid())]
+    assert server.tracker.count == 0
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_process_workers_serve_and_stop():
+    server = AppServer(slow_app, port=0, mode="processes", workers=2, drain_timeout=2).start()
+    try:
+        pids = {fetch(server.url + "/fast") for _ in range(10)}
+        assert str(os.getpid()) not in pids
+    finally:
+        server.stop()
+    assert server._children == []
+
+
+def test_app_server_ends_event_streams_on_stop():
+    import server as flask_server
+    http_server = flask_server.serve(host="127.0.0.1", port=0, mode="threaded", drain_timeout=5)
+    http_server.start()
+    lines = []
+
+    def listen():
+        with urllib.request.urlopen(http_server.url + "/api/events", timeout=10) as response:
+            for line in response:
+                lines.append(line)
+
+    listener = threading.Thread(target=listen)
+    listener.start()
+    time.sleep(0.2)
+    assert fetch(http_server.url + "/api/health")
+    started = time.perf_counter()
+    http_server.stop()
+    listener.join(timeout=5)
+    assert not listener.is_alive()
+    assert time.perf_counter() - started < 5
+    assert lines[0].startswith(b"retry:")
+    flask_server.storage.changes = type(flask_server.storage.changes)()
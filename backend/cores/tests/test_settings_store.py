@@ -0,0 +1,51 @@
+import settings_store
+from settings_store import load_settings, save_settings, get_storage_settings
+
+
+def test_save_keeps_unrelated_settings(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings_store, "get_settings_path", lambda: str(tmp_path / "settings.json"))
+    save_settings({"storage": {"pool_size": 2}})
+    save_settings({"language": "zh"})
+    settings = load_settings()
+    assert settings["language"] == "zh"
+    assert settings["storage"]["pool_size"] == 2
+    assert get_storage_settings()["journal_mode"] == "WAL"
+
+
+def test_reads_are_cached_until_the_file_changes(tmp_path, monkeypatch):
+    path = tmp_path / "settings.json"
+    monkeypatch.setattr(settings_store, "get_settings_path", lambda: str(path))
+    save_settings({"language": "zh"})
+    reads = []
+    real_read = settings_store._read
+    monkeypatch.setattr(settings_store, "_read", lambda p: reads.append(p) or real_read(p))
+    assert load_settings()["language"] == "zh"
+    load_settings()["language"] = "mutated"
+    assert load_settings()["language"] == "zh"
+    assert reads == []
+
+    path.write_text('{"language": "en", "extra": 1}', encoding="utf-8")
+    assert load_settings()["language"] == "en"
+    assert len(reads) == 1
+
+
+def test_save_is_atomic_and_notifies_subscribers(tmp_path, monkeypatch):
+    path = tmp_path / "settings.json"
+    monkeypatch.setattr(settings_store, "get_settings_path", lambda: str(path))
+    load_settings()
+    seen = []
+    unsubscribe = settings_store.subscribe(lambda settings, changed: seen.append((settings["language"], changed)))
+    try:
+        save_settings({"language": "zh"})
+        written = path.stat().st_ino
+        # Saving what is already on disk does not write the file again.
+        save_settings({"language": "zh"})
+        assert path.stat().st_ino == written
+        path.write_text('{"language": "en", "server": {"port": 6000}}', encoding="utf-8")
+        assert settings_store.check_for_changes()
+        assert not settings_store.check_for_changes()
+    finally:
+        unsubscribe()
+    save_settings({"language": "zh"})
+    assert seen == [("zh", {"language"}), ("en", {"language", "server"})]
+    assert [entry.name for entry in tmp_path.iterdir()] == ["settings.json"]
@@ -0,0 +1,58 @@
+import gzip
+import pytest
+from static_files import IMMUTABLE, StaticManifest, choose_encoding
+
+BUNDLE = "console.log('todo');\n" * 100
+
+
+@pytest.fixture
+def dist(tmp_path):
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "index.html").write_text("<!doctype html><div id=root></div>" * 20, encoding="utf-8")
+    (tmp_path / "assets" / "index-BzX3k9aQ.js").write_text(BUNDLE, encoding="utf-8")
+    (tmp_path / "assets" / "index-BzX3k9aQ.js.br").write_bytes(b"prebuilt brotli")
+    (tmp_path / "vite.svg").write_text("<svg/>", encoding="utf-8")
+    return tmp_path
+
+
+def test_hashed_assets_are_immutable_and_compressed(dist):
+    manifest = StaticManifest(str(dist))
+    assert "assets/index-BzX3k9aQ.js.br" not in manifest.assets
+    status, headers, body = manifest.respond("/assets/index-BzX3k9aQ.js", accept_encoding="gzip, deflate")
+    assert status == 200
+    assert headers["Cache-Control"] == IMMUTABLE
+    assert headers["Content-Encoding"] == "gzip"
+    assert headers["Vary"] == "Accept-Encoding"
+    assert gzip.decompress(body).decode() == BUNDLE
+
+    status, headers, body = manifest.respond("/assets/index-BzX3k9aQ.js", accept_encoding="br;q=1, gzip;q=0.5")
+    assert (headers["Content-Encoding"], body) == ("br", b"prebuilt brotli")
+
+    status, headers, body = manifest.respond("/assets/index-BzX3k9aQ.js", accept_encoding="gzip;q=0")
+    assert "Content-Encoding" not in headers
+    assert body.decode() == BUNDLE
+
+
+def test_index_revalidates_with_etag(dist):
+    manifest = StaticManifest(str(dist))
+    status, headers, _ = manifest.respond("/", accept_encoding="gzip")
+    assert status == 200 and headers["Cache-Control"] == "no-cache"
+    assert manifest.respond("/", accept_encoding="gzip", if_none_match=headers["ETag"])[0] == 304
+    # The gzip and identity bodies differ, so they must not share an ETag.
+    assert manifest.respond("/", if_none_match=headers["ETag"])[0] == 200
+
+
+def test_unknown_paths_fall_back_to_index(dist):
+    manifest = StaticManifest(str(dist))
+    _, headers, body = manifest.respond("/tasks/42")
+    assert headers["Content-Type"].startswith("text/html")
+    assert body.startswith(b"<!doctype html>")
+    _, headers, body = manifest.respond("/vite.svg", accept_encoding="gzip")
+    assert "Content-Encoding" not in headers and body == b"<svg/>"
+
+
+def test_choose_encoding():
+    variants = {"identity": b"", "gzip": b""}
+    assert choose_encoding(variants, None) == "identity"
+    assert choose_encoding(variants, "*") == "gzip"
+    assert choose_encoding(variants, "br") == "identity"
@@ -1,8 +1,13 @@
 import pytest
 import sqlite3
 import os
-from ..storage import SQLStorage
-from ..dbinit import SQLinit
+import threading
+import io
+from storage import SQLStorage
+from dbinit import SQLinit
+from task_import import ImportAborted, iter_records
+from query_plan import is_full_scan
+from change_feed import RELAY_LIMIT, ChangeRelay
 
 @pytest.fixture
 def setup_database():
@@ -14,7 +19,475 @@ def setup_database():
     os.remove(db_path)
 
 
+@pytest.fixture
+def storage():
+    db_path = SQLinit("test_tasks")
+    store = SQLStorage("test_tasks", pool_size=2)
+    yield store
+    store.close()
+    os.remove(db_path)
+
+
+def test_add_and_list_roundtrip(storage):
+    task_id = storage.add_task({"description": "write tests", "details": "pool"})
+    tasks = storage.list_task_flasks()
+    assert [task["id"] for task in tasks] == [task_id]
+    assert tasks[0]["category"] == "personal"
+    assert tasks[0]["completed"] is False
+
+
+def test_observers_get_structured_events_without_stdout(storage, capsys):
+    events = []
+    unsubscribe = storage.observe(events.append)
+    task_id = storage.add_task({"description": "observed"})
+    storage.done_task(task_id)
+    storage.remove_task(task_id + 100)
+    rows = storage.list_tasks()
+    unsubscribe()
+    storage.reopen_task(task_id)
+
+    assert [(event.op, event.task_id, event.rowcount) for event in events] == [
+        ("add", task_id, 1), ("done", task_id, 1), ("remove", task_id + 100, 0), ("list", None, 1)
+    ]
+    assert all(event.duration >= 0 for event in events)
+    assert not events[2].ok
+    assert rows[0][0] == task_id
+    assert capsys.readouterr().out == ""
+
+
+def test_feed_reads_emit_timing_events(storage):
+    events = []
+    storage.observe(events.append)
+    storage.add_task({"description": "counted"})
+    storage.current_version()
+    storage.count_by_status()
+    storage.changes_since(0)
+    assert [(event.op, event.rowcount) for event in events] == [
+        ("add", 1), ("version", 1), ("count", 1), ("changes", 1)
+    ]
+    assert all(event.ok for event in events)
+
+
+def test_pool_reuses_connections(storage):
+    with storage.pool.connection() as first:
+        pass
+    with storage.pool.connection() as second:
+        pass
+    assert first is second
+    assert storage.pool.stats()["open"] == 1
+
+
+def test_pool_is_bounded_across_threads(storage):
+    errors = []
+
+    def worker():
+        try:
+            for i in range(20):
+                storage.add_task({"description": f"task {i}"})
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(storage.list_task_flasks()) == 80
+    assert storage.pool.stats()["open"] <= 2
+
+
+def test_pool_rolls_back_failed_transactions(storage):
+    with pytest.raises(sqlite3.IntegrityError):
+        with storage.pool.connection() as conn:
+            conn.execute("INSERT INTO tasks (description) VALUES ('kept out')")
+            conn.execute("INSERT INTO tasks (description) VALUES (NULL)")
+    assert storage.list_task_flasks() == []
+
+
+def test_closed_pool_rejects_checkout(storage):
+    storage.close()
+    with pytest.raises(RuntimeError):
+        storage.add_task({"description": "too late"})
+
+
+def test_pooled_connections_use_storage_profile(storage):
+    with storage.pool.connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+        assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2
+
+
+def test_wal_checkpoint_runs(storage):
+    storage.add_task({"description": "checkpoint me"})
+    busy, _, _ = storage.checkpointer.checkpoint()
+    assert busy == 0
+
+
+def test_query_tasks_filters_in_sql(storage):
+    storage.add_task({"description": "Buy milk", "category": "personal", "priority": "low", "due_date": "2024-01-05"})
+    work_id = storage.add_task({"description": "Ship 100% of report", "category": "work", "priority": "high", "due_date": "2024-01-02"})
+    storage.add_task({"description": "Read paper", "details": "ship notes", "category": "study"})
+    storage.done_task(work_id)
+
+    done, _ = storage.query_tasks(status="done")
+    assert [task["id"] for task in done] == [work_id]
+    assert [t["description"] for t in storage.query_tasks(category="study")[0]] == ["Read paper"]
+    assert len(storage.query_tasks(q="ship")[0]) == 2
+    assert [t["description"] for t in storage.query_tasks(q="100%")[0]] == ["Ship 100% of report"]
+    assert [t["id"] for t in storage.query_tasks(due_before="2024-01-03")[0]] == [work_id]
+    assert storage.count_by_status() == {"open": 2, "done": 1}
+
+
+def test_due_filters_are_exclusive_and_skip_undated(storage):
+    early = storage.add_task({"description": "early", "due_date": "2024-01-02"})
+    late = storage.add_task({"description": "late", "due_date": "2024-01-05"})
+    storage.add_task({"description": "undated"})
+
+    def ids(**filters):
+        return [task["id"] for task in storage.query_tasks(**filters)[0]]
+
+    assert ids(due_before="2024-01-05") == [early]
+    assert ids(due_after="2024-01-02") == [late]
+    assert ids(due_after="2024-01-02", due_before="2024-01-05") == []
+    assert ids(due_after="2024-01-01", sort="-due_date") == [late, early]
+
+
+@pytest.mark.parametrize("sort", ["id", "-id", "due_date", "-due_date"])
+def test_keyset_pagination_visits_every_row_once(storage, sort):
+    for i in range(23):
+        due = None if i % 4 == 0 else f"2024-02-{i % 7 + 1:02d}"
+        storage.add_task({"description": f"task {i}", "due_date": due})
+    expected, _ = storage.query_tasks(sort=sort)
+
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = storage.query_tasks(sort=sort, limit=5, cursor=cursor)
+        seen.extend(page)
+        if cursor is None:
+            break
+    assert [task["id"] for task in seen] == [task["id"] for task in expected]
+
+
+def test_query_tasks_rejects_bad_input(storage):
+    with pytest.raises(ValueError):
+        storage.query_tasks(sort="description")
+    with pytest.raises(ValueError):
+        storage.query_tasks(cursor="not-a-cursor", limit=5)
+    with pytest.raises(ValueError):
+        storage.query_tasks(status="archived")
+
+
+def test_iter_task_rows_streams_in_chunks(storage):
+    ids = [storage.add_task({"description": f"task {i}"}) for i in range(5)]
+    chunks = list(storage.iter_task_rows(chunk_size=2))
+    assert [len(rows) for rows in chunks] == [2, 2, 1]
+    assert [row[0] for rows in chunks for row in rows] == ids
+
+    stream = storage.iter_task_rows(chunk_size=2)
+    next(stream)
+    # The stream reads one snapshot on its own connection, outside the pool.
+    assert storage.pool.stats()["in_use"] == 0
+    storage.add_task({"description": "late"})
+    assert sum(len(rows) for rows in stream) == 3
+
+    with pytest.raises(ValueError):
+        storage.iter_task_rows(sort="color")
+
+
+def test_import_tasks_in_one_transaction(storage):
+    first = storage.add_task({"description": "existing"})
+    storage.remove_task(first)
+    records = iter_records(io.StringIO(
+        '{"description": "imported one", "details": "bulk", "due_date": "2024-05-01"}\n'
+        '{"description": ""}\n'
+        '{"description": "imported two", "completed": true}\n'
+    ), "ndjson")
+    report = storage.import_tasks(records, chunk_size=1)
+    assert (report.imported, report.skipped) == (2, 1)
+    assert report.errors == [{"row": 2, "error": "Description is required"}]
 
+    tasks = storage.query_tasks()[0]
+    assert [task["description"] for task in tasks] == ["imported one", "imported two"]
+    assert tasks[0]["id"] > first
+    assert tasks[1]["completed"] is True
+    assert [result["id"] for result in storage.search_tasks("bulk")] == [tasks[0]["id"]]
+    changes = storage.changes_since(0, limit=1)
+    assert changes["has_more"] and changes["tasks"][0]["id"] == tasks[0]["id"]
 
+    later = storage.add_task({"description": "after import"})
+    assert storage.changes_since(storage.current_version() - 1)["tasks"][0]["id"] == later
 
 
+def test_strict_import_rolls_back(storage):
+    records = iter_records(io.StringIO("description,due_date\nfine,2024-01-01\nbad,tomorrow\n"), "csv")
+    with pytest.raises(ImportAborted):
+        storage.import_tasks(records, strict=True, chunk_size=1)
+    assert storage.query_tasks()[0] == []
+    storage.add_task({"description": "triggers restored"})
+    assert len(storage.search_tasks("restored")) == 1
+
+
+def test_change_relay_republishes_writes_from_other_processes(storage):
+    worker = SQLStorage("test_tasks", pool_size=1)
+    try:
+        worker.reset_after_fork()
+        relay = ChangeRelay(worker.changes, worker)
+        subscription = worker.changes.subscribe()
+        kept = storage.add_task({"description": "kept"})
+        gone = storage.add_task({"description": "gone"})
+        storage.done_task(kept)
+        storage.remove_task(gone)
+        relay.poll()
+        events = [subscription.get(timeout=1) for _ in range(2)]
+        assert [(event["op"], event["id"]) for event in events] == [("insert", kept), ("delete", gone)]
+        assert events[0]["task"]["completed"] is True and "version" not in events[0]["task"]
+        relay.poll()
+        assert subscription.get(timeout=0) is None
+        # A worker's seq numbers mean nothing to its siblings: always reset.
+        assert worker.changes.events_since(worker.changes.seq) is None
+
+        storage.import_tasks(enumerate(({"description": f"bulk {n}"} for n in range(RELAY_LIMIT + 1)), start=1))
+        relay.poll()
+        assert subscription.get(timeout=1)["op"] == "reset"
+        assert relay.version == storage.current_version()
+    finally:
+        worker.close()
+
+
+def test_storage_queries_do_not_scan(storage):
+    storage.close()
+    planned = SQLStorage("test_tasks", pool_size=1, explain_queries=True)
+    try:
+        task_id = planned.add_task({"description": "plan", "due_date": "2024-03-01"})
+        planned.update_task(task_id, "plan", "", "2024-03-02", "work", "high", None)
+        planned.done_task(task_id)
+        planned.reopen_task(task_id)
+        planned.count_by_status()
+        planned.changes_since(0, limit=10)
+        for filters in (
+            {"status": "open"},
+            {"status": "done", "sort": "due_date"},
+            {"category": "work"},
+            {"category": "work", "priority": "high"},
+            {"priority": "low"},
+            {"status": "open", "category": "study", "priority": "medium"},
+            {"due_after": "2024-01-01", "due_before": "2024-12-31"},
+            {"due_before": "2024-12-31"},
+            {"due_after": "2024-01-01"},
+            {"q": "plan"},
+            {"status": "open", "q": "plan ab"},
+            {"q": "ab"},
+            {"q": "报告"},
+        ):
+            _, cursor = planned.query_tasks(limit=1, **filters)
+            planned.query_tasks(limit=1, cursor="WzEsMV0" if cursor is None else cursor, **filters)
+        planned.query_tasks(limit=1, cursor="WzEsMV0")
+        planned.remove_task(task_id)
+        plans = planned.plan_recorder.plans
+        assert plans
+        assert planned.plan_recorder.violations() == []
+        # The two scans that are let through on purpose: count_by_status has
+        # no WHERE, and a short search term falls back to LIKE.
+        assert any(shape.startswith("SELECT completed, COUNT(*)") and " WHERE " not in shape for shape in plans)
+        like_scans = [
+            shape for shape, plan in plans.items()
+            if "LIKE ? ESCAPE ?" in shape and any(is_full_scan(detail) for detail in plan)
+        ]
+        assert like_scans
+    finally:
+        planned.close()
+
+
+def test_plan_recorder_keys_by_statement_shape(storage):
+    storage.close()
+    planned = SQLStorage("test_tasks", pool_size=1, explain_queries=True)
+    try:
+        for n in range(50):
+            task_id = planned.add_task({"description": f"task {n}", "due_date": f"2024-03-{n % 28 + 1:02d}"})
+            planned.done_task(task_id)
+            planned.query_tasks(limit=1, category="work", due_before=f"2024-04-{n % 28 + 1:02d}")
+        planned.apply_batch([{"op": "remove", "id": n} for n in range(1, 10)])
+        planned.apply_batch([{"op": "remove", "id": n} for n in range(10, 40)])
+        shapes = list(planned.plan_recorder.plans)
+        assert len(shapes) < 20
+        assert not any("2024" in shape or "'" in shape for shape in shapes)
+    finally:
+        planned.close()
+
+
+def test_search_ranks_and_highlights_matches(storage):
+    assert storage.fts_enabled
+    report_id = storage.add_task({"description": "Weekly report", "details": "send the report to the team"})
+    storage.add_task({"description": "Groceries", "details": "milk, eggs, report card"})
+    storage.add_task({"description": "Unrelated"})
+
+    results = storage.search_tasks("report")
+    assert [result["id"] for result in results][0] == report_id
+    assert len(results) == 2
+    assert "<mark>report</mark>" in results[0]["snippet"]["description"]
+    assert len(storage.search_tasks("repo", limit=1)) == 1
+
+
+def test_search_handles_cjk_and_short_terms(storage):
+    storage.add_task({"description": "准备周报", "details": "周五之前发给老师"})
+    storage.add_task({"description": "买牛奶"})
+
+    assert [r["description"] for r in storage.search_tasks("准备周")] == ["准备周报"]
+    assert [r["description"] for r in storage.search_tasks("牛奶")] == ["买牛奶"]
+    assert [t["description"] for t in storage.query_tasks(q="周五之")[0]] == ["准备周报"]
+
+
+def test_search_index_follows_updates_and_deletes(storage):
+    task_id = storage.add_task({"description": "draft slides"})
+    storage.update_task(task_id, "final slides", "", None, "work", "high", None)
+    assert storage.search_tasks("draft") == []
+    assert [r["id"] for r in storage.search_tasks("final")] == [task_id]
+    storage.remove_task(task_id)
+    assert storage.search_tasks("final") == []
+
+
+def test_apply_batch_reports_per_item_results(storage):
+    keep = storage.add_task({"description": "keep"})
+    results, applied = storage.apply_batch([
+        {"op": "add", "description": "new"},
+        {"op": "done", "id": keep},
+        {"op": "remove", "id": 9999},
+        {"op": "explode"},
+        {"op": "update", "id": keep, "description": "renamed", "priority": "high"},
+    ])
+    assert applied
+    assert [result["ok"] for result in results] == [True, True, False, False, True]
+    assert results[2]["error"] == "Task not found"
+    tasks = {task["id"]: task for task in storage.list_task_flasks()}
+    assert tasks[keep]["completed"] is True
+    assert tasks[keep]["description"] == "renamed"
+    assert tasks[results[0]["id"]]["description"] == "new"
+
+
+def test_apply_batch_rejects_bad_fields_per_item(storage):
+    keep = storage.add_task({"description": "keep"})
+    results, applied = storage.apply_batch([
+        {"op": "add", "description": "a", "details": {"x": 1}},
+        {"op": "add", "description": "b"},
+        {"op": "update", "id": keep, "description": None},
+        {"op": "update", "id": keep, "description": "kept", "category": ["work"]},
+        {"op": "add", "description": "c", "due_date": 20240101},
+    ])
+    assert applied
+    assert [result["ok"] for result in results] == [False, True, False, False, False]
+    assert results[0]["error"] == "details must be a string"
+    assert results[2]["error"] == "description must be a string"
+    assert results[3]["error"] == "category must be a string"
+    assert results[4]["error"] == "due_date must be a string"
+    assert sorted(task["description"] for task in storage.list_task_flasks()) == ["b", "keep"]
+
+
+def test_apply_batch_retries_failed_run_item_by_item(storage):
+    conn = sqlite3.connect(storage.db_path)
+    conn.execute("""
+        CREATE TRIGGER reject_bad BEFORE INSERT ON tasks WHEN NEW.description = 'bad'
+        BEGIN SELECT RAISE(ABORT, 'bad task'); END
+    """)
+    conn.commit()
+    conn.close()
+    results, applied = storage.apply_batch([
+        {"op": "add", "description": "good"},
+        {"op": "add", "description": "bad"},
+        {"op": "add", "description": "also good"},
+    ])
+    assert applied
+    assert [result["ok"] for result in results] == [True, False, True]
+    assert results[1]["error"] == "bad task"
+    assert sorted(task["description"] for task in storage.list_task_flasks()) == ["also good", "good"]
+
+
+def test_apply_batch_remove_same_id_twice(storage):
+    task_id = storage.add_task({"description": "once"})
+    results, _ = storage.apply_batch([{"op": "remove", "id": task_id}, {"op": "remove", "id": task_id}])
+    assert [result["ok"] for result in results] == [True, False]
+
+
+def test_atomic_batch_rolls_back_everything(storage):
+    task_id = storage.add_task({"description": "stay open"})
+    results, applied = storage.apply_batch([
+        {"op": "add", "description": "never stored"},
+        {"op": "done", "id": task_id},
+        {"op": "remove", "id": 424242},
+    ], atomic=True)
+    assert not applied
+    assert [result.get("error") for result in results] == ["Rolled back", "Rolled back", "Task not found"]
+    tasks = storage.list_task_flasks()
+    assert [task["id"] for task in tasks] == [task_id]
+    assert tasks[0]["completed"] is False
+
+
+def test_mutations_publish_change_events(storage):
+    subscription = storage.changes.subscribe()
+    task_id = storage.add_task({"description": "feed me"})
+    storage.done_task(task_id)
+    storage.update_task(task_id, "fed", "", None, "work", "low", None)
+    storage.remove_task(task_id)
+    storage.remove_task(task_id)
+    storage.apply_batch([{"op": "add", "description": "batched"}, {"op": "reopen", "id": -5}])
+
+    events = []
+    while True:
+        event = subscription.get(timeout=0.1)
+        if event is None:
+            break
+        events.append(event)
+    assert [event["op"] for event in events] == ["insert", "update", "update", "delete", "insert"]
+    assert events[0]["task"]["description"] == "feed me"
+    assert events[1]["changes"] == {"completed": True}
+    assert events[2]["changes"]["description"] == "fed"
+    assert [event["seq"] for event in events] == sorted(event["seq"] for event in events)
+
+
+def test_changes_since_returns_only_new_rows_and_tombstones(storage):
+    first = storage.add_task({"description": "first"})
+    second = storage.add_task({"description": "second"})
+    checkpoint = storage.current_version()
+
+    storage.done_task(first)
+    storage.remove_task(second)
+    third = storage.add_task({"description": "third"})
+
+    changes = storage.changes_since(checkpoint)
+    assert [task["id"] for task in changes["tasks"]] == [first, third]
+    assert changes["deleted"] == [second]
+    assert changes["version"] == storage.current_version()
+    assert storage.changes_since(changes["version"])["tasks"] == []
+
+    everything = storage.changes_since(0)
+    assert {task["id"] for task in everything["tasks"]} == {first, third}
+
+
+def test_changes_since_pages_by_version(storage):
+    ids = [storage.add_task({"description": f"task {i}"}) for i in range(5)]
+    seen = []
+    since = 0
+    while True:
+        page = storage.changes_since(since, limit=2)
+        seen.extend(task["id"] for task in page["tasks"])
+        since = page["version"]
+        if not page["has_more"]:
+            break
+    assert seen == ids
+
+
+def test_legacy_database_gets_versioned(tmp_path, monkeypatch):
+    import dbinit
+    monkeypatch.setattr(dbinit, "get_data_dir", lambda: str(tmp_path))
+    conn = sqlite3.connect(str(tmp_path / "legacy.db"))
+    conn.execute("CREATE TABLE tasks (id INTEGER PRIMARY KEY AUTOINCREMENT, description TEXT NOT NULL, details TEXT, completed BOOLEAN DEFAULT 0, due_date DATE)")
+    conn.execute("INSERT INTO tasks (description) VALUES ('old')")
+    conn.commit()
+    conn.close()
+
+    SQLinit("legacy")
+    conn = sqlite3.connect(str(tmp_path / "legacy.db"))
+    assert conn.execute("SELECT version, category, priority FROM tasks").fetchall() == [(1, "personal", "medium")]
+    assert conn.execute("SELECT version FROM change_counter").fetchone() == (1,)
+    conn.close()
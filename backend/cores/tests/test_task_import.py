@@ -0,0 +1,69 @@
+import io
+import pytest
+import server
+import task_import
+from task_import import detect_format, iter_json, validate_task
+
+
+def test_iter_json_across_read_boundaries(monkeypatch):
+    monkeypatch.setattr(task_import, "READ_SIZE", 3)
+    text = ' [ {"description": "a"} , 12345, "xyzw" ,{"description": "b"}]'
+    assert [value for _, value in iter_json(io.StringIO(text))] == [
+        {"description": "a"}, 12345, "xyzw", {"description": "b"}
+    ]
+
+
+@pytest.mark.parametrize("read_size", range(1, 12))
+def test_iter_json_waits_for_tokens_cut_by_a_read(monkeypatch, read_size):
+    monkeypatch.setattr(task_import, "READ_SIZE", read_size)
+    values = [{"description": "caf\u00e9 \"x\"", "completed": False, "color": None}, True, -1.5e3, "long " * 20]
+    text = task_import.json.dumps(values)
+    assert [value for _, value in iter_json(io.StringIO(text))] == task_import.json.loads(text)
+
+
+def test_iter_json_fails_fast_on_an_early_bad_element(monkeypatch):
+    monkeypatch.setattr(task_import, "READ_SIZE", 64)
+    reads = []
+
+    class Stream(io.StringIO):
+        def read(self, size=-1):
+            reads.append(size)
+            return super().read(size)
+
+    text = '[{"description": "a"}, {"description": b}, ' + ", ".join(['{"description": "x"}'] * 10000) + "]"
+    with pytest.raises(ValueError, match="element 2"):
+        list(iter_json(Stream(text)))
+    assert len(reads) < 5
+
+
+def test_iter_json_accepts_export_document():
+    text = '{"tasks": [{"id": 1, "description": "a"}], "counts": {"open": 1, "done": 0}}'
+    assert list(iter_json(io.StringIO(text))) == [(1, {"id": 1, "description": "a"})]
+
+
+def test_iter_json_rejects_truncated_input():
+    with pytest.raises(ValueError):
+        list(iter_json(io.StringIO('[{"description": "a"}, {"descr')))
+
+
+def test_validate_task_normalizes_csv_values():
+    params = validate_task({"description": "a", "completed": "yes", "category": "", "color": ""})
+    assert params == ("a", "", True, None, "personal", "medium", None)
+    with pytest.raises(ValueError):
+        validate_task({"description": "a", "due_date": "tomorrow"})
+
+
+def test_non_string_fields_are_row_errors():
+    with pytest.raises(ValueError):
+        validate_task({"description": "a", "color": {"r": 1}})
+    text = '{"description": "bad", "details": ["x"]}\n{"description": "good"}\n'
+    report = server.storage.import_tasks(task_import.iter_ndjson(io.StringIO(text)))
+    assert (report.imported, report.skipped) == (1, 1)
+    assert report.errors == [{"row": 1, "error": "details must be a string"}]
+
+
+def test_detect_format():
+    assert detect_format(filename="dump.JSONL") == "ndjson"
+    assert detect_format(content_type="text/csv; charset=utf-8") == "csv"
+    with pytest.raises(ValueError):
+        detect_format(filename="tasks.txt")
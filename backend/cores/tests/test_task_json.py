@@ -0,0 +1,30 @@
+import json
+from task_json import choose_format, encode_task_list
+from task_query import row_to_task
+
+
+ROWS = [
+    (1, "Write \"report\"", "line\nbreak", 1, "2024-05-01", "work", "high", "#ff0000"),
+    (2, "买牛奶 ☕", "", 0, None, "personal", "medium", None),
+]
+
+
+def test_objects_match_generic_encoder():
+    body = encode_task_list(ROWS, next_cursor=None, counts={"open": 1, "done": 1})
+    assert json.loads(body) == {
+        "tasks": [row_to_task(row) for row in ROWS],
+        "next_cursor": None,
+        "counts": {"open": 1, "done": 1},
+    }
+
+
+def test_columnar_rows():
+    data = json.loads(encode_task_list(ROWS, "columnar"))
+    assert data["rows"][0] == [1, "Write \"report\"", "line\nbreak", True, "2024-05-01", "work", "high", "#ff0000"]
+    assert data["rows"][1][4] is None
+
+
+def test_choose_format():
+    assert choose_format({}, None) == "objects"
+    assert choose_format({}, "application/vnd.todolist.columnar+json") == "columnar"
+    assert choose_format({"format": "objects"}, "application/vnd.todolist.columnar+json") == "objects"
@@ -0,0 +1,59 @@
+from datetime import date, timedelta
+import pytest
+from urllib import error as urlerror
+import server
+import settings_store
+from serving import AppServer
+from tray_client import LocalClient, HttpClient
+
+
+def due_before():
+    return (date.today() + timedelta(days=3)).isoformat()
+
+
+@pytest.fixture
+def api_server():
+    app_server = AppServer(server.get_app(), port=0).start()
+    yield app_server
+    app_server.stop()
+
+
+def test_local_client_uses_storage(tmp_path, monkeypatch):
+    path = tmp_path / "settings.json"
+    monkeypatch.setattr(settings_store, "get_settings_path", lambda: str(path))
+    client = LocalClient(server.storage)
+    task_id = client.add_task("tray local", due_date=date.today().isoformat())
+    tasks, counts = client.due_soon(due_before(), 50)
+    task = next(item for item in tasks if item["id"] == task_id)
+    assert (task["category"], task["priority"]) == ("personal", "medium")
+    assert counts["open"] >= 1
+    assert client.mark_done(task_id)
+    assert task_id not in [item["id"] for item in client.due_soon(due_before(), 50)[0]]
+    # The tray saves settings itself; the client does not write them again.
+    client.set_language("zh")
+    assert not path.exists()
+
+
+def test_http_client_against_api_server(api_server):
+    client = HttpClient(api_server.url + "/api")
+    task_id = client.add_task("tray http", due_date=date.today().isoformat())
+    assert client.mark_done(task_id)
+    tasks, counts = client.due_soon(due_before(), 5)
+    assert task_id not in [item["id"] for item in tasks]
+    assert counts["done"] >= 1
+    with pytest.raises(urlerror.HTTPError):
+        client.request("POST", "/done", {})
+
+
+def test_clients_agree_on_a_missing_task(api_server):
+    missing = 10 ** 9
+    assert LocalClient(server.storage).mark_done(missing) is False
+    assert HttpClient(api_server.url + "/api").mark_done(missing) is False
+
+
+def test_http_client_reports_a_stopped_server():
+    app_server = AppServer(server.get_app(), port=0).start()
+    url = app_server.url + "/api"
+    app_server.stop()
+    with pytest.raises(urlerror.URLError):
+        HttpClient(url).add_task("nobody home")
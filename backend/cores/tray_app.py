@@ -3,22 +3,18 @@ import sys
 import subprocess
 import webbrowser
 import time
-import json
 from datetime import date, timedelta
-import tkinter as tk
-from tkinter import simpledialog, messagebox
 import threading
 import shutil
 import platform
 from urllib import request as urlrequest
 from urllib import error as urlerror
-from PIL import Image, ImageDraw
 import pystray
 from pystray import MenuItem as item
 from app_paths import get_logs_dir, get_resource_path, get_project_root
-from werkzeug.serving import make_server
-import server as flask_server
-from settings_store import load_settings, save_settings
+from settings_store import load_settings, save_settings, get_server_settings
+from tray_client import LocalClient, HttpClient
+from event_bus import bus, SETTINGS, TASKS, connect_settings, connect_storage, connect_remote
 
 ROOT_DIR = get_project_root()
 FRONTEND_DIR = os.path.join(ROOT_DIR, "frontend")
@@ -27,20 +23,34 @@ LOG_DIR = get_logs_dir()
 FRONTEND_LOG = os.path.join(LOG_DIR, "frontend.log")
 BACKEND_LOG = os.path.join(LOG_DIR, "backend.log")
 FRONTEND_CMD = None
-API_BASE = "http://127.0.0.1:5000/api"
+SERVER_SETTINGS = get_server_settings()
+SERVER_HOST = "127.0.0.1" if SERVER_SETTINGS["host"] in ("", "0.0.0.0", "::") else SERVER_SETTINGS["host"]
+API_BASE = f"http://{SERVER_HOST}:{SERVER_SETTINGS['port']}/api"
 DEV_FRONTEND_URL = "http://127.0.0.1:5173"  # Vite dev
-STATIC_FRONTEND_URL = "http://127.0.0.1:5000/"
+STATIC_FRONTEND_URL = f"http://{SERVER_HOST}:{SERVER_SETTINGS['port']}/"
 ICON_PATH = get_resource_path("todolist_win.ico")
 
 server_proc = None
 server_thread = None
+api_client = None
+api_client_lock = threading.Lock()
+server_ready = threading.Event()
 frontend_proc = None
 tk_root = None
+tk_thread = None
+tk_lock = threading.Lock()
 last_backend_error = ""
 last_frontend_error = ""
 USE_TK = True
 tray_icon = None
-last_language = None
+task_events_connected = False
+task_summary = {"open": None, "due_soon": []}
+summary_timer = None
+summary_lock = threading.Lock()
+DUE_SOON_DAYS = 3
+DUE_SOON_LIMIT = 5
+# Coalesces bursts of task events (imports, batches) into one refresh.
+SUMMARY_DELAY_SECONDS = 0.3
 
 TRAY_LABELS = {
     "en": {
@@ -50,7 +60,11 @@ TRAY_LABELS = {
         "open_ui": "Open UI",
         "quit": "Quit",
         "language_en": "English",
-        "language_zh": "中文"
+        "language_zh": "中文",
+        "due_soon": "Due soon",
+        "nothing_due": "Nothing due soon",
+        "mark_done": "Mark done: {due}  {description}",
+        "title": "TodoList - {count} open"
     },
     "zh": {
         "quick_add": "快速添加",
@@ -59,12 +73,17 @@ TRAY_LABELS = {
         "open_ui": "打开界面",
         "quit": "退出",
         "language_en": "English",
-        "language_zh": "中文"
+        "language_zh": "中文",
+        "due_soon": "即将到期",
+        "nothing_due": "近期没有到期任务",
+        "mark_done": "标记完成：{due}  {description}",
+        "title": "TodoList - {count} 项未完成"
     }
 }
 
 
 def create_icon_image():
+    from PIL import Image, ImageDraw
     if os.path.isfile(ICON_PATH):
         try:
             return Image.open(ICON_PATH)
@@ -83,9 +102,19 @@ def start_server():
         if server_thread is not None:
             return
         try:
-            server_thread = make_server("127.0.0.1", 5000, flask_server.app)
-            threading.Thread(target=server_thread.serve_forever, daemon=True).start()
-            time.sleep(0.4)
+            # Imported here, not at startup, so the tray icon shows before
+            # Flask and SQLite are set up.
+            import server as flask_server
+            # Forking would copy the whole tray process, so the embedded
+            # server stays on threads.
+            mode = "pool" if SERVER_SETTINGS["mode"] == "processes" else None
+            server_thread = flask_server.serve(mode=mode)
+            flask_server.storage.pool.prewarm()
+            server_thread.start()
+            reset_client()
+            # The socket is already bound, so requests queue up from here on
+            # even before the accept loop starts.
+            server_ready.set()
             return
         except Exception as exc:
             append_log(BACKEND_LOG, f"Failed to start embedded server: {exc}")
@@ -94,6 +123,7 @@ def start_server():
 
     if server_proc is not None and server_proc.poll() is None:
         return
+    server_ready.clear()
     backend_log = open(BACKEND_LOG, "a", encoding="utf-8")
     server_proc = subprocess.Popen(
         SERVER_CMD,
@@ -101,7 +131,6 @@ def start_server():
         stdout=backend_log,
         stderr=backend_log
     )
-    time.sleep(0.8)
 
 
 def start_frontend():
@@ -122,17 +151,21 @@ def start_frontend():
         stderr=frontend_log,
         shell=False
     )
-    time.sleep(1.2)
 
 
 def stop_server():
     global server_proc, server_thread
+    server_ready.clear()
+    reset_client()
     if server_thread is not None:
         try:
-            server_thread.shutdown()
+            # Stops accepting, then waits for in-flight requests to finish.
+            server_thread.stop()
         except Exception:
             pass
         server_thread = None
+        import server as flask_server
+        flask_server.close_app()
         return
     if server_proc is None:
         return
@@ -183,45 +216,52 @@ def get_frontend_url():
 
 def is_backend_ready():
     global last_backend_error
+    if server_ready.is_set():
+        return True
     try:
-        req = urlrequest.Request(f"{API_BASE}/list", method="GET")
+        req = urlrequest.Request(f"{API_BASE}/health", method="GET")
         with urlrequest.urlopen(req, timeout=2):
+            server_ready.set()
             return True
     except Exception as exc:
         last_backend_error = str(exc)
-        append_log(BACKEND_LOG, f"Backend readiness check failed: {exc}")
         return False
 
 
 def is_frontend_ready():
     global last_frontend_error
+    if has_static_frontend():
+        # The bundled UI is served by the backend itself.
+        return is_backend_ready()
     try:
         req = urlrequest.Request(get_frontend_url(), method="GET")
         with urlrequest.urlopen(req, timeout=2):
             return True
     except Exception as exc:
         last_frontend_error = str(exc)
-        append_log(FRONTEND_LOG, f"Frontend readiness check failed: {exc}")
         return False
 
 
-def wait_for_service(check_fn, timeout_seconds=10, interval_seconds=0.5):
+def wait_for_service(check_fn, timeout_seconds=10, interval_seconds=0.1, ready_event=None):
     deadline = time.time() + timeout_seconds
     while time.time() < deadline:
         if check_fn():
             return True
-        time.sleep(interval_seconds)
-    return False
+        if ready_event is not None:
+            ready_event.wait(interval_seconds)
+        else:
+            time.sleep(interval_seconds)
+    return check_fn()
 
 
 def show_error(message):
-    root = init_tk_root()
-    messagebox.showerror("TodoList", message, parent=root)
+    from tkinter import messagebox
+    run_in_tk(lambda: messagebox.showerror("TodoList", message, parent=tk_root), wait=True)
 
 
 def show_info(message):
-    root = init_tk_root()
-    messagebox.showinfo("TodoList", message, parent=root)
+    from tkinter import messagebox
+    run_in_tk(lambda: messagebox.showinfo("TodoList", message, parent=tk_root), wait=True)
 
 
 def read_log_tail(path, max_lines=20):
@@ -245,64 +285,86 @@ def append_log(path, message):
         pass
 
 
+def get_client():
+    # Embedded server: call its storage directly, no HTTP round trip.
+    global api_client
+    with api_client_lock:
+        if api_client is None:
+            if server_thread is not None:
+                import server as flask_server
+                api_client = LocalClient(flask_server.storage)
+            else:
+                api_client = HttpClient(API_BASE)
+        return api_client
+
+
+def reset_client():
+    global api_client
+    with api_client_lock:
+        api_client = None
+
+
 def api_add_task(description, details="", due_date=None):
-    payload = {
-        "description": description,
-        "details": details,
-        "due_date": due_date
-    }
-    data = json.dumps(payload).encode("utf-8")
-    req = urlrequest.Request(
-        f"{API_BASE}/add",
-        data=data,
-        headers={"Content-Type": "application/json"},
-        method="POST"
-    )
-    with urlrequest.urlopen(req, timeout=5) as response:
-        payload = response.read().decode("utf-8") or "{}"
-    try:
-        return json.loads(payload).get("task_id")
-    except Exception:
-        return None
+    return get_client().add_task(description, details, due_date)
 
 
 def api_mark_done(task_id):
-    payload = {"id": task_id}
-    data = json.dumps(payload).encode("utf-8")
-    req = urlrequest.Request(
-        f"{API_BASE}/done",
-        data=data,
-        headers={"Content-Type": "application/json"},
-        method="POST"
-    )
-    with urlrequest.urlopen(req, timeout=5):
-        pass
+    get_client().mark_done(task_id)
+
+
+def api_due_soon():
+    due_before = (date.today() + timedelta(days=DUE_SOON_DAYS)).isoformat()
+    return get_client().due_soon(due_before, DUE_SOON_LIMIT)
 
 
 def api_set_language(lang):
-    payload = {"language": lang}
-    data = json.dumps(payload).encode("utf-8")
-    req = urlrequest.Request(
-        f"{API_BASE}/settings",
-        data=data,
-        headers={"Content-Type": "application/json"},
-        method="POST"
-    )
-    with urlrequest.urlopen(req, timeout=5):
-        pass
+    get_client().set_language(lang)
 
 
-def init_tk_root():
+def _run_tk(ready):
     global tk_root
-    if tk_root is not None:
-        return tk_root
-    tk_root = tk.Tk()
-    tk_root.withdraw()
-    tk_root.attributes("-topmost", True)
+    import tkinter as tk
+    root = tk.Tk()
+    root.withdraw()
+    root.attributes("-topmost", True)
+    tk_root = root
+    ready.set()
+    root.mainloop()
+
+
+def init_tk_root():
+    # Tk is only loaded for the first dialog; it then owns a thread of its
+    # own and every dialog is scheduled onto it.
+    global tk_thread
+    with tk_lock:
+        if tk_root is None:
+            ready = threading.Event()
+            tk_thread = threading.Thread(target=_run_tk, args=(ready,), name="tk", daemon=True)
+            tk_thread.start()
+            ready.wait()
     return tk_root
 
 
+def run_in_tk(fn, wait=False):
+    root = init_tk_root()
+    if threading.current_thread() is tk_thread:
+        fn()
+        return
+    done = threading.Event()
+
+    def call():
+        try:
+            fn()
+        finally:
+            done.set()
+
+    root.after(0, call)
+    if wait:
+        done.wait()
+
+
 def _tk_choose_from_list(root, title, message, options):
+    import tkinter as tk
     if root is None:
         return ""
     result = {"value": ""}
@@ -340,6 +402,7 @@ def _tk_choose_from_list(root, title, message, options):
 
 
 def prompt_quick_add(root):
+    from tkinter import simpledialog
     description = simpledialog.askstring("Quick Add", "Task description:", parent=root)
     if not description:
         return None
@@ -363,6 +426,7 @@ def prompt_quick_add(root):
 
 
 def quick_add_flow():
+    from tkinter import messagebox
     try:
         root = init_tk_root()
         result = prompt_quick_add(root)
@@ -400,18 +464,16 @@ def quick_add_flow():
 
 def quick_add_task(icon, _item):
     start_server()
-    if tk_root is None:
-        init_tk_root()
-    tk_root.after(0, quick_add_flow)
+    run_in_tk(quick_add_flow)
 
 
 def set_language(lang):
+    # The settings subscription refreshes the menu.
     save_settings({"language": lang})
     try:
         api_set_language(lang)
     except Exception:
         pass
-    refresh_menu()
 
 
 def get_language():
@@ -422,8 +484,18 @@ def get_language():
 
 
 def build_menu():
-    labels = TRAY_LABELS[get_language()]
     current_lang = get_language()
+    labels = TRAY_LABELS[current_lang]
+    if task_summary["due_soon"]:
+        due_items = [
+            item(
+                labels["mark_done"].format(due=task["due_date"], description=task["description"]),
+                complete_action(task["id"])
+            )
+            for task in task_summary["due_soon"]
+        ]
+    else:
+        due_items = [item(labels["nothing_due"], None, enabled=False)]
     language_menu = pystray.Menu(
         item(
             labels["language_en"],
@@ -441,6 +513,7 @@ def build_menu():
     )
     return pystray.Menu(
         item(labels["quick_add"], quick_add_task),
+        item(labels["due_soon"], pystray.Menu(*due_items)),
         item(labels["settings"], settings_menu),
         item(labels["open_ui"], lambda _icon, _item: open_frontend()),
         item(labels["quit"], quit_app)
@@ -458,19 +531,61 @@ def refresh_menu():
         pass
 
 
-def watch_language_changes(interval_seconds=2.0):
-    global last_language
-    while True:
+def complete_action(task_id):
+    def action(_icon, _item):
         try:
-            current = get_language()
-            if last_language is None:
-                last_language = current
-            elif current != last_language:
-                last_language = current
-                refresh_menu()
-        except Exception:
-            pass
-        time.sleep(interval_seconds)
+            api_mark_done(task_id)
+        except Exception as exc:
+            append_log(BACKEND_LOG, f"Failed to complete task {task_id}: {exc}")
+    return action
+
+
+def refresh_task_summary():
+    try:
+        due_soon, counts = api_due_soon()
+    except Exception as exc:
+        append_log(BACKEND_LOG, f"Failed to refresh task summary: {exc}")
+        return
+    task_summary["due_soon"] = due_soon
+    task_summary["open"] = counts.get("open")
+    update_title()
+    refresh_menu()
+
+
+def update_title():
+    if tray_icon is not None and task_summary["open"] is not None:
+        tray_icon.title = TRAY_LABELS[get_language()]["title"].format(count=task_summary["open"])
+
+
+def schedule_summary_refresh(_event=None):
+    global summary_timer
+    with summary_lock:
+        if summary_timer is not None:
+            summary_timer.cancel()
+        summary_timer = threading.Timer(SUMMARY_DELAY_SECONDS, refresh_task_summary)
+        summary_timer.daemon = True
+        summary_timer.start()
+
+
+def connect_task_events():
+    # Task deltas come from the embedded server's change feed, or from
+    # /api/events when the server is a separate process.
+    global task_events_connected
+    if task_events_connected:
+        return
+    task_events_connected = True
+    if server_thread is not None:
+        import server as flask_server
+        connect_storage(flask_server.storage)
+    else:
+        connect_remote(f"{API_BASE}/events")
+    schedule_summary_refresh()
+
+
+def on_settings_changed(payload):
+    if "language" in payload["changed"]:
+        update_title()
+        refresh_menu()
 
 
 def quit_app(icon, _item):
@@ -498,8 +613,14 @@ def start_services(show_success):
         show_error(f"Failed to start frontend:\n{exc}")
         return
 
-    backend_ok = wait_for_service(is_backend_ready, timeout_seconds=8, interval_seconds=0.5)
-    frontend_ok = wait_for_service(is_frontend_ready, timeout_seconds=12, interval_seconds=0.5)
+    backend_ok = wait_for_service(is_backend_ready, timeout_seconds=8, ready_event=server_ready)
+    if backend_ok:
+        connect_task_events()
+    frontend_ok = wait_for_service(is_frontend_ready, timeout_seconds=12)
+    if not backend_ok:
+        append_log(BACKEND_LOG, f"Backend readiness check failed: {last_backend_error}")
+    if not frontend_ok:
+        append_log(FRONTEND_LOG, f"Frontend readiness check failed: {last_frontend_error}")
 
     if backend_ok and frontend_ok:
         if show_success:
@@ -535,11 +656,11 @@ def start_services(show_success):
 def main():
     global tray_icon
     tray_icon = pystray.Icon("todolist", create_icon_image(), "TodoList", build_menu())
-    threading.Thread(target=watch_language_changes, daemon=True).start()
-    threading.Thread(target=tray_icon.run, daemon=True).start()
-    init_tk_root()
-    tk_root.after(0, lambda: start_services(show_success=False))
-    tk_root.mainloop()
+    connect_settings()
+    bus.subscribe(SETTINGS, on_settings_changed)
+    bus.subscribe(TASKS, schedule_summary_refresh)
+    threading.Thread(target=lambda: start_services(show_success=False), daemon=True).start()
+    tray_icon.run()
 
 
 if __name__ == "__main__":
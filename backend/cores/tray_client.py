@@ -0,0 +1,88 @@
+import http.client
+import json
+from urllib import error as urlerror
+from urllib import parse as urlparse
+
+
+def new_task(description, details="", due_date=None):
+    # Same defaults as the /api/add route.
+    return {
+        "description": description,
+        "details": details,
+        "completed": False,
+        "due_date": due_date,
+        "category": "personal",
+        "priority": "medium",
+        "color": None
+    }
+
+
+class LocalClient:
+    # Embedded server: call the SQLStorage the API itself uses. Change events
+    # still reach the web UI because SQLStorage publishes them.
+    def __init__(self, storage):
+        self.storage = storage
+
+    def add_task(self, description, details="", due_date=None):
+        return self.storage.add_task(new_task(description, details, due_date))
+
+    def mark_done(self, task_id):
+        return self.storage.done_task(task_id)
+
+    def set_language(self, lang):
+        # Same process as the tray: its save_settings() already reached the
+        # server through the settings subscription.
+        pass
+
+    def due_soon(self, due_before, limit):
+        tasks, _ = self.storage.query_tasks(sort="due_date", limit=limit, status="open", due_before=due_before)
+        return tasks, self.storage.count_by_status()
+
+
+class HttpClient:
+    # Server in another process. The werkzeug server closes the connection
+    # after every response, so there is nothing to keep alive between calls.
+    def __init__(self, api_base, timeout=5):
+        parts = urlparse.urlsplit(api_base)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip("/")
+        self.timeout = timeout
+
+    def request(self, method, path, payload=None):
+        url = f"http://{self.host}:{self.port}{self.prefix}{path}"
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            conn.request(method, self.prefix + path, body=body, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+        except OSError as exc:
+            raise urlerror.URLError(exc)
+        finally:
+            conn.close()
+        if response.status >= 400:
+            raise urlerror.HTTPError(url, response.status, response.reason, response.headers, None)
+        return json.loads(data.decode("utf-8") or "{}")
+
+    def add_task(self, description, details="", due_date=None):
+        payload = {"description": description, "details": details, "due_date": due_date}
+        return self.request("POST", "/add", payload).get("task_id")
+
+    def mark_done(self, task_id):
+        try:
+            self.request("POST", "/done", {"id": task_id})
+        except urlerror.HTTPError as exc:
+            if exc.code == 404:
+                return False
+            raise
+        return True
+
+    def set_language(self, lang):
+        self.request("POST", "/settings", {"language": lang})
+
+    def due_soon(self, due_before, limit):
+        query = urlparse.urlencode({"status": "open", "sort": "due_date", "limit": limit, "due_before": due_before})
+        data = self.request("GET", f"/list?{query}")
+        return data.get("tasks", []), data.get("counts", {})
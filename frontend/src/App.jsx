@@ -1,7 +1,8 @@
-import { useEffect, useMemo, useState } from 'react'
+import { useEffect, useMemo, useRef, useState } from 'react'
 import dayjs from 'dayjs'
 import {
   addTask,
+  applyBatch,
   fetchTasks,
   markDone,
   removeTask,
@@ -9,6 +10,7 @@ import {
   updateTask,
   fetchSettings,
   saveSettings,
+  subscribeToChanges,
 } from './api'
 import './App.css'
 
@@ -53,6 +55,19 @@ const PRIORITY_COLORS = {
   low: '#10b981',
 }
 
+function matchesFilters(task, filters) {
+  if (filters.status === 'open' && task.completed) return false
+  if (filters.status === 'done' && !task.completed) return false
+  if (filters.category !== 'all' && task.category !== filters.category) return false
+  if (filters.priority !== 'all' && task.priority !== filters.priority) return false
+  if (!filters.q) return true
+  const haystack = `${task.description} ${task.details || ''}`.toLowerCase()
+  return filters.q
+    .toLowerCase()
+    .split(/\s+/)
+    .every((term) => haystack.includes(term))
+}
+
 const STRINGS = {
   en: {
     eyebrow: 'Daily Focus',
@@ -87,6 +102,7 @@ const STRINGS = {
     allCategories: 'All categories',
     allPriorities: 'All priorities',
     loading: 'Loading...',
+    loadMore: 'Load more',
     noTasks: 'No tasks yet.',
     noDueDate: 'No due date',
     due: 'Due',
@@ -94,6 +110,8 @@ const STRINGS = {
     reopen: 'Reopen',
     edit: 'Edit',
     delete: 'Delete',
+    clearDone: 'Clear completed',
+    clearDoneConfirm: (count) => `Delete ${count} completed tasks?`,
     save: 'Save',
     cancel: 'Cancel',
     pastDueConfirm: 'Due date is in the past. Add anyway and mark it done?',
@@ -131,6 +149,7 @@ const STRINGS = {
     allCategories: '全部分类',
     allPriorities: '全部优先级',
     loading: '加载中...',
+    loadMore: '加载更多',
     noTasks: '暂无任务。',
     noDueDate: '无截止',
     due: '截止',
@@ -138,6 +157,8 @@ const STRINGS = {
     reopen: '重新打开',
     edit: '编辑',
     delete: '删除',
+    clearDone: '清除已完成',
+    clearDoneConfirm: (count) => `删除 ${count} 条已完成任务？`,
     save: '保存',
     cancel: '取消',
     pastDueConfirm: '截止日期早于今天，是否仍要添加并自动标记为完成？',
@@ -160,28 +181,30 @@ function App() {
   const [editing, setEditing] = useState(false)
   const [settingLang, setSettingLang] = useState(false)
   const [quickDatePreset, setQuickDatePreset] = useState('')
+  const [nextCursor, setNextCursor] = useState(null)
+  const [loadingMore, setLoadingMore] = useState(false)
+  const [counts, setCounts] = useState({ open: 0, done: 0 })
+  const [debouncedSearch, setDebouncedSearch] = useState('')
+  const [liveUpdates, setLiveUpdates] = useState(false)
+  const loadMoreRef = useRef(null)
+  const listStateRef = useRef({})
+  const countsTimerRef = useRef(null)
 
   const hasTasks = useMemo(() => tasks.length > 0, [tasks])
-  const completedCount = useMemo(
-    () => tasks.filter((task) => task.completed).length,
-    [tasks]
-  )
-  const openCount = useMemo(
-    () => tasks.length - completedCount,
-    [tasks, completedCount]
+  const completedCount = counts.done
+  const openCount = counts.open
+  const loadedDoneIds = tasks.filter((task) => task.completed).map((task) => task.id)
+  // Filtering happens server-side; the loaded pages already match the filters.
+  const filteredTasks = tasks
+  const listFilters = useMemo(
+    () => ({
+      status: statusFilter,
+      category: categoryFilter,
+      priority: priorityFilter,
+      q: debouncedSearch,
+    }),
+    [statusFilter, categoryFilter, priorityFilter, debouncedSearch]
   )
-  const filteredTasks = useMemo(() => {
-    const keyword = searchTerm.trim().toLowerCase()
-    return tasks.filter((task) => {
-      if (statusFilter === 'open' && task.completed) return false
-      if (statusFilter === 'done' && !task.completed) return false
-      if (categoryFilter !== 'all' && task.category !== categoryFilter) return false
-      if (priorityFilter !== 'all' && task.priority !== priorityFilter) return false
-      if (!keyword) return true
-      const haystack = `${task.description} ${task.details || ''}`.toLowerCase()
-      return haystack.includes(keyword)
-    })
-  }, [tasks, statusFilter, categoryFilter, priorityFilter, searchTerm])
 
   const groupedTasks = useMemo(() => {
     const groups = {
@@ -201,9 +224,44 @@ function App() {
 
   useEffect(() => {
     loadSettings()
+  }, [])
+
+  useEffect(() => {
+    const timer = setTimeout(() => setDebouncedSearch(searchTerm.trim()), 250)
+    return () => clearTimeout(timer)
+  }, [searchTerm])
+
+  useEffect(() => {
     loadTasks()
+  }, [listFilters])
+
+  listStateRef.current = { filters: listFilters, nextCursor, loadTasks }
+
+  useEffect(() => {
+    const source = subscribeToChanges({
+      onChange: applyChange,
+      onReset: () => listStateRef.current.loadTasks(),
+      onOpen: () => setLiveUpdates(true),
+      onError: () => setLiveUpdates(false),
+    })
+    return () => {
+      source.close()
+      clearTimeout(countsTimerRef.current)
+    }
   }, [])
 
+  useEffect(() => {
+    const node = loadMoreRef.current
+    if (!node || !nextCursor) return undefined
+    const observer = new IntersectionObserver((entries) => {
+      if (entries.some((entry) => entry.isIntersecting)) {
+        loadMore()
+      }
+    })
+    observer.observe(node)
+    return () => observer.disconnect()
+  }, [nextCursor, loadingMore])
+
   async function loadSettings() {
     try {
       const data = await fetchSettings()
@@ -229,8 +287,12 @@ function App() {
     setLoading(true)
     setError('')
     try {
-      const data = await fetchTasks()
+      const data = await fetchTasks(listFilters)
       setTasks(data.tasks || [])
+      setNextCursor(data.next_cursor || null)
+      if (data.counts) {
+        setCounts(data.counts)
+      }
     } catch (err) {
       setError(err.message || 'Failed to load tasks')
     } finally {
@@ -241,6 +303,68 @@ function App() {
     }
   }
 
+  function scheduleCountsRefresh() {
+    clearTimeout(countsTimerRef.current)
+    countsTimerRef.current = setTimeout(async () => {
+      try {
+        const data = await fetchTasks({ limit: 1 })
+        if (data.counts) {
+          setCounts(data.counts)
+        }
+      } catch (err) {
+        // Counts catch up on the next change or reload.
+      }
+    }, 300)
+  }
+
+  function applyChange(event) {
+    const { filters, nextCursor: cursor } = listStateRef.current
+    if (event.op === 'insert') {
+      // Process workers relay other workers' writes as inserts of the whole
+      // row, so an insert for a row already on screen replaces it. Rows are
+      // ordered by id, so a new row only belongs on screen once every
+      // earlier page has been loaded.
+      const matches = matchesFilters(event.task, filters)
+      setTasks((prev) => {
+        if (prev.some((task) => task.id === event.id)) {
+          return prev.flatMap((task) => {
+            if (task.id !== event.id) return [task]
+            return matches ? [event.task] : []
+          })
+        }
+        return !cursor && matches ? [...prev, event.task] : prev
+      })
+    } else if (event.op === 'update') {
+      setTasks((prev) =>
+        prev.flatMap((task) => {
+          if (task.id !== event.id) return [task]
+          const next = { ...task, ...event.changes }
+          return matchesFilters(next, filters) ? [next] : []
+        })
+      )
+    } else if (event.op === 'delete') {
+      setTasks((prev) => prev.filter((task) => task.id !== event.id))
+    }
+    scheduleCountsRefresh()
+  }
+
+  async function loadMore() {
+    if (!nextCursor || loadingMore) return
+    setLoadingMore(true)
+    try {
+      const data = await fetchTasks({ ...listFilters, cursor: nextCursor })
+      setTasks((prev) => [...prev, ...(data.tasks || [])])
+      setNextCursor(data.next_cursor || null)
+      if (data.counts) {
+        setCounts(data.counts)
+      }
+    } catch (err) {
+      setError(err.message || 'Failed to load tasks')
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   function handleChange(event) {
     const { name, value } = event.target
     setForm((prev) => ({ ...prev, [name]: value }))
@@ -285,7 +409,7 @@ function App() {
       }
       setForm(initialForm)
       setQuickDatePreset('')
-      await loadTasks()
+      if (!liveUpdates) await loadTasks()
     } catch (err) {
       setError(err.message || 'Failed to add task')
     } finally {
@@ -297,7 +421,7 @@ function App() {
     setError('')
     try {
       await markDone(id)
-      await loadTasks()
+      if (!liveUpdates) await loadTasks()
     } catch (err) {
       setError(err.message || 'Failed to mark task as done')
     }
@@ -307,7 +431,7 @@ function App() {
     setError('')
     try {
       await removeTask(id)
-      await loadTasks()
+      if (!liveUpdates) await loadTasks()
     } catch (err) {
       setError(err.message || 'Failed to remove task')
     }
@@ -317,12 +441,24 @@ function App() {
     setError('')
     try {
       await reopenTask(id)
-      await loadTasks()
+      if (!liveUpdates) await loadTasks()
     } catch (err) {
       setError(err.message || 'Failed to reopen task')
     }
   }
 
+  async function handleClearDone() {
+    if (!window.confirm(t('clearDoneConfirm', loadedDoneIds.length))) return
+    setError('')
+    try {
+      // One request and one transaction for the whole set.
+      await applyBatch(loadedDoneIds.map((id) => ({ op: 'remove', id })))
+      if (!liveUpdates) await loadTasks()
+    } catch (err) {
+      setError(err.message || 'Failed to remove tasks')
+    }
+  }
+
   function startEdit(task) {
     setEditingId(task.id)
     setEditForm({
@@ -359,7 +495,7 @@ function App() {
       })
       setEditingId(null)
       setEditForm(initialForm)
-      await loadTasks()
+      if (!liveUpdates) await loadTasks()
     } catch (err) {
       setError(err.message || 'Failed to update task')
     } finally {
@@ -586,6 +722,11 @@ function App() {
             <option value="medium">{priorityLabels.medium}</option>
             <option value="low">{priorityLabels.low}</option>
           </select>
+          {loadedDoneIds.length > 0 && (
+            <button type="button" className="ghost danger" onClick={handleClearDone}>
+              {t('clearDone')}
+            </button>
+          )}
           {loading && <span className="pill">{t('loading')}</span>}
         </div>
         {error && <div className="error">{error}</div>}
@@ -759,6 +900,18 @@ function App() {
               </div>
             )
           })}
+        {!loading && nextCursor && (
+          <div className="actions" ref={loadMoreRef}>
+            <button
+              type="button"
+              className="ghost"
+              onClick={loadMore}
+              disabled={loadingMore}
+            >
+              {loadingMore ? t('loading') : t('loadMore')}
+            </button>
+          </div>
+        )}
       </section>
     </div>
   )
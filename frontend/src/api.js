@@ -1,4 +1,6 @@
-const API_BASE = 'http://127.0.0.1:5000';
+// Same origin when the backend serves the built UI (any host/port), the
+// default backend address under the Vite dev server.
+const API_BASE = window.location.port === '5173' ? 'http://127.0.0.1:5000' : '';
 
 async function handleResponse(res) {
   if (!res.ok) {
@@ -8,11 +10,34 @@ async function handleResponse(res) {
   return res.json();
 }
 
-export async function fetchTasks() {
-  const res = await fetch(`${API_BASE}/api/list`);
+export const PAGE_SIZE = 50;
+
+export async function fetchTasks({ cursor, limit = PAGE_SIZE, ...filters } = {}) {
+  const params = new URLSearchParams();
+  Object.entries(filters).forEach(([key, value]) => {
+    if (value !== undefined && value !== null && value !== '' && value !== 'all') {
+      params.set(key, value);
+    }
+  });
+  params.set('limit', limit);
+  if (cursor) {
+    params.set('cursor', cursor);
+  }
+  const res = await fetch(`${API_BASE}/api/list?${params.toString()}`);
   return handleResponse(res);
 }
 
+export function subscribeToChanges({ onChange, onReset, onOpen, onError }) {
+  // EventSource resends Last-Event-ID on reconnect, so the server replays
+  // whatever was missed while the connection was down.
+  const source = new EventSource(`${API_BASE}/api/events`);
+  source.addEventListener('change', (event) => onChange?.(JSON.parse(event.data)));
+  source.addEventListener('reset', () => onReset?.());
+  source.onopen = () => onOpen?.();
+  source.onerror = () => onError?.();
+  return source;
+}
+
 export async function addTask(task) {
   const res = await fetch(`${API_BASE}/api/add`, {
     method: 'POST',
@@ -58,6 +83,15 @@ export async function updateTask(task) {
   return handleResponse(res);
 }
 
+export async function applyBatch(operations, atomic = false) {
+  const res = await fetch(`${API_BASE}/api/batch`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ operations, atomic }),
+  });
+  return handleResponse(res);
+}
+
 export async function fetchSettings() {
   const res = await fetch(`${API_BASE}/api/settings`);
   return handleResponse(res);